@@ -11,14 +11,15 @@
 import streamlit as st
 import re
 import os
+import time
+import uuid
+import threading
 from dotenv import load_dotenv # Needed here for initial API key check
 from typing import Any
 
-# Import functions from the backend agent module
-from backend.student_data import DataStore
-from backend.rag_vector_store import initialize_rag_db, get_rag_context
-from backend.langgraph_workflow import run_quiz_generation_agent
-from backend.quiz_evaluation_graph import run_quiz_evaluation_agent
+# Quiz generation, evaluation and student data are served by the FastAPI backend (backend/api.py)
+from backend.api_client import QuizApiClient
+from backend.performance_evaluator import compute_performance_stats
 
 
 load_dotenv() # Load .env at the very top of the Streamlit app
@@ -28,64 +29,14 @@ load_dotenv() # Load .env at the very top of the Streamlit app
 st.set_page_config(page_title="AI Quiz Generator", layout="centered")
 
 
-MONGODB_URI = os.getenv("MONGODB_URI")
-data_store = DataStore(mongo_uri=MONGODB_URI)
-
-
-#--------------------------------------------------------------------------------------------------------------------------------------
-#--------------------------------------------------------------------------------------------------------------------------------------
-# ------------------             Initialize session state variables                --------------------
-#--------------------------------------------------------------------------------------------------------------------------------------
-#--------------------------------------------------------------------------------------------------------------------------------------
-
-
-
-# Sample RAG Content (for demonstration)
-# In a real app, this would come from files, a database, etc.
-RAG_SAMPLE_TEXT = """
-Class 1-5 Basic Math: Addition is the process of combining two or more numbers to get a total. Subtraction is taking one number away from another. Multiplication is repeated addition, and division is splitting into equal parts. Fractions represent parts of a whole.
-
-Class 6-8 Science: Photosynthesis is the process by which plants make their food using sunlight, water, and carbon dioxide. The human circulatory system includes the heart and blood vessels that transport oxygen and nutrients.
-
-Class 9-12 Physics: Newton's Laws of Motion describe how forces affect an object's movement. The first law states an object at rest stays at rest unless acted upon by a force.
-
-Bachelors: Advanced mathematics includes subjects like linear algebra, calculus, and differential equations. Computer science covers algorithms, data structures, programming paradigms, and software development principles.
-
-Masters: Topics include advanced algorithms, machine learning, artificial intelligence, distributed computing, and data science.
-"""
-
-
-
-#--------------------------------------------------------------------------------------------------------------------------------------
-#--------------------------------------------------------------------------------------------------------------------------------------
-# -----------             Initialize FAISS Vector Store using st.cache_resource                --------------------
-#--------------------------------------------------------------------------------------------------------------------------------------
-#--------------------------------------------------------------------------------------------------------------------------------------
-
-
 @st.cache_resource
-def get_faiss_vector_store():
+def get_api_client():
     """
-    Initializes and caches the FAISS vector store.
-    This function runs only once per app session.
+    One HTTP client (and connection pool) to the backend API per Streamlit server.
     """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        st.error("❌ Google Gemini API Key not found. Please set GOOGLE_API_KEY in your .env file.")
-        st.stop() # Stop the app if API key is missing
-    
-    try:
-        vector_store = initialize_rag_db(RAG_SAMPLE_TEXT, api_key)
-        print("✅ RAG knowledge base initialized successfully!")
-        return vector_store
-    except Exception as e:
-        st.error(f"❌ Error initializing RAG knowledge base: {e}")
-        st.stop() # Stop if RAG initialization fails
-
-# Initialize the vector store at app startup
-vector_store = get_faiss_vector_store()
-
+    return QuizApiClient(os.getenv("API_URL", "http://localhost:8000"))
 
+api = get_api_client()
 
 
 #--------------------------------------------------------------------------------------------------------------------------------------
@@ -126,6 +77,32 @@ def initialize_session_state():
 
 initialize_session_state()
 
+
+
+def start_question_stream(n, class_name, subject, language, include_rag):
+    """
+    Starts quiz generation (streamed from the backend API) in a background thread.
+    Questions are appended to st.session_state["questions"] as soon as each one is parsed;
+    st.session_state["generation"]["done"] turns True when generation has finished.
+    """
+    generation = {"questions": [], "done": False, "error": None}
+
+    def worker():
+        try:
+            for question in api.stream_quiz(n, class_name, subject, language, include_rag):
+                generation["questions"].append(question)
+        except Exception as e:
+            generation["error"] = str(e)
+        finally:
+            generation["done"] = True
+
+    st.session_state["generation"] = generation
+    st.session_state["questions"] = generation["questions"]  # same list, filled by the worker
+    st.session_state["answers"] = []
+    st.session_state["current_q"] = 0
+    st.session_state["current_selected_option"] = None
+    threading.Thread(target=worker, daemon=True).start()
+
 #--------------------------------------------------------------------------------------------------------------------------------------
 #--------------------------------------------------------------------------------------------------------------------------------------
 # ------------------             Initialize class and Title                --------------------
@@ -201,7 +178,8 @@ if st.session_state.preferred_language or st.session_state.student_id :
 
 
         if st.session_state.student_id:
-            student_perf = data_store.get_student_performance(st.session_state.student_id)
+            # Totals only; a subject's topics are fetched when it is expanded
+            student_perf = api.get_student_summary(st.session_state.student_id)
             if student_perf:
 
                 st.markdown(
@@ -238,6 +216,16 @@ if st.session_state.preferred_language or st.session_state.student_id :
                 prog_val = float(overall_pct) / 100 if overall_pct else 0.0
                 st.progress(prog_val)
 
+                # Recent accuracy per subject (aggregated by the backend from the attempt history)
+                recent = api.get_recent_accuracy(st.session_state.student_id, days=7)
+                if recent:
+                    st.markdown(
+                        f"""<div style='font-size:16px; font-weight:400; color:#589; margin-bottom:15px;'>
+                        Last 7 days: """ + " &mdash; ".join(
+                            f"{row['subject']} <span style='font-weight:700; color:#1BC2A0'>{row['accuracy'] * 100:.0f}%</span>"
+                            for row in recent
+                        ) + "</div>", unsafe_allow_html=True)
+
                 st.markdown(f"""<div style='font-size:16px; font-weight:800; color:#589; margin-bottom:15px;'>
                             <span style='font-size:20px;font-weight:600'> 
                             📚 Subject Performance </span></div>""", unsafe_allow_html= True)
@@ -248,10 +236,10 @@ if st.session_state.preferred_language or st.session_state.student_id :
                     subj_total = subj_stats.get("total_attempts", 0)
                     subj_corr = subj_stats.get("correct_count", 0)
                     subj_pct = int(subj_corr / subj_total * 100) if subj_total else 0
-                    subject_rows.append((subject, subj_pct, subj_corr, subj_total, subj_stats.get("topics", {})))
+                    subject_rows.append((subject, subj_pct, subj_corr, subj_total))
 
                 
-                subject_pct_list = [(subject, subj_pct) for subject, subj_pct, _, _, _ in subject_rows]
+                subject_pct_list = [(subject, subj_pct) for subject, subj_pct, _, _ in subject_rows]
                 lowest_subjects = sorted(subject_pct_list, key=lambda x: x[1])[:2]
 
 
@@ -262,7 +250,7 @@ if st.session_state.preferred_language or st.session_state.student_id :
                         st.session_state["expanded_subject"] = subject_name
 
                 # Display subject bars and expanders
-                for subject, subj_pct, subj_corr, subj_total, topics in subject_rows:
+                for subject, subj_pct, subj_corr, subj_total in subject_rows:
                     cols = st.columns([5, 5, 3])
                     cols[0].markdown(f"""<div style='font-size:16px; font-weight:700; color:#589; margin-bottom:15px;'><span style='font-size:18px;font-weight:600'> {subject} </span></div>""", unsafe_allow_html= True)
                     cols[1].progress(subj_pct / 100 if subj_pct else 0.0)
@@ -283,6 +271,7 @@ if st.session_state.preferred_language or st.session_state.student_id :
                     if st.session_state["expanded_subject"] == subject:
                         with st.expander(f"Topic Performance for {subject}", expanded=True):
                             # Topic bars, one line each
+                            topics = api.get_subject_topics(st.session_state.student_id, subject)
                             for topic, t_stats in topics.items():
                                 topic_total = t_stats.get("total_attempts", 0)
                                 topic_corr = t_stats.get("correct_count", 0)
@@ -507,42 +496,13 @@ elif st.session_state.stage == 2 :
                 class_selected = class_selected
             else:
 
-                # AUTO-DETECT MODE: Get weakest subject and topics from DB
-                student_perf = data_store.get_student_performance(st.session_state.student_id)
-                if not student_perf or "subjects" not in student_perf:
+                # AUTO-DETECT MODE: weakest subject(s) and their topics under 90% accuracy,
+                # selected by the database (see DataStore.get_weakest_topics)
+                selected_subject = api.get_weakest_topics(st.session_state.student_id, max_topics=3)
+                if not selected_subject:
                     st.error("❌ No past performance data found. Please take a quiz first before using auto-detect.")
                     st.stop()
 
-                # 1. Find min accuracy across subjects
-                subject_accs = []
-                for subj, stats in student_perf["subjects"].items():
-                    total = stats.get("total_attempts", 0)
-                    if total > 0:
-                        acc = stats.get("correct_count", 0) / total
-                        subject_accs.append((subj, acc))
-                if not subject_accs:
-                    st.error("❌ No subjects with attempts found.")
-                    st.stop()
-
-                min_acc = min(acc for _, acc in subject_accs)
-                lowest_subjects = [subj for subj, acc in subject_accs if acc == min_acc]
-
-                # 2. For each lowest subject, pick up to 2 weakest topics <90% accuracy
-                selected_subject = []
-                for subj in lowest_subjects:
-                    topics_data = student_perf["subjects"][subj].get("topics", {})
-                    topic_accs = [
-                        (t, tdata.get("correct_count", 0) / max(tdata.get("total_attempts", 1), 1))
-                        for t, tdata in topics_data.items()
-                        if tdata.get("total_attempts", 0) > 0
-                    ]
-                    weak_topics = [t for t, acc in sorted(topic_accs, key=lambda x: x[1]) if acc < 0.9]
-                    if weak_topics:
-                        for topic in weak_topics[:3]:
-                            selected_subject.append(f"{subj} - {topic}")
-                    else:
-                        selected_subject.append(subj)
-
                 
                 
 
@@ -558,7 +518,7 @@ elif st.session_state.stage == 2 :
                     st.stop()
 
             # Clear previous quiz state
-            for key in ["questions", "answers", "current_q"]:
+            for key in ["questions", "answers", "current_q", "generation"]:
                 st.session_state.pop(key, None)
 
             # Store session state
@@ -585,30 +545,37 @@ elif st.session_state.stage == 2 :
 
 elif st.session_state.stage == 3:
     
-    if st.session_state.get('quiz_started') and not st.session_state.get("questions"):
+    if st.session_state.get('quiz_started') and "generation" not in st.session_state:
+        # Generate in a background thread; questions appear in st.session_state["questions"]
+        # one by one, so the student can start answering before the whole quiz is ready.
+        start_question_stream(
+            n=st.session_state["num_questions"],
+            class_name=st.session_state["class"],
+            subject=st.session_state["subject"],
+            language=st.session_state['preferred_language'],
+            include_rag=st.session_state['auto_detect'] # Pass the flag here! (the API owns the FAISS vector store)
+        )
+
+    generation = st.session_state.get("generation")
+
+    if generation and not generation["questions"] and not generation["done"]:
         with st.spinner("🎯 Generating questions..."):
-            subject_to_generate = st.session_state["subject"]
-            
-            # Pass the auto_detect flag as the include_rag parameter AND the vector_store
-            parsed = run_quiz_generation_agent(
-                n=st.session_state["num_questions"],
-                class_name=st.session_state["class"],
-                subject=subject_to_generate,
-                language=st.session_state['preferred_language'],
-                include_rag=st.session_state['auto_detect'], # Pass the flag here!
-                vector_store=vector_store # Pass the initialized FAISS vector store
-            )
+            # Wait only for the first question
+            while not generation["questions"] and not generation["done"]:
+                time.sleep(0.2)
+        st.rerun()
 
-            if parsed:
-                st.session_state["questions"] = parsed
-                st.session_state["current_q"] = 0
-                st.session_state["answers"] = [""] * len(parsed)  # Initialize answers list with empty strings
-                st.session_state["current_selected_option"] = None
-                st.success("✅ Questions Ready!")
-                st.rerun()
-            else:
-                st.error("❌ Failed to generate questions. This might be due to an LLM generation issue or parsing problem. Please try again or adjust your input.")
-                st.session_state['quiz_started'] = False
+    if generation and generation["done"] and not generation["questions"]:
+        st.error("❌ Failed to generate questions. This might be due to an LLM generation issue or parsing problem. Please try again or adjust your input.")
+        if generation["error"]:
+            print(f"Question generation error: {generation['error']}")
+        st.session_state['quiz_started'] = False
+
+    # Grow the answers list as new questions arrive
+    if st.session_state.get("questions"):
+        missing_answers = len(st.session_state["questions"]) - len(st.session_state["answers"])
+        if missing_answers > 0:
+            st.session_state["answers"].extend([""] * missing_answers)
 
 
 
@@ -670,6 +637,13 @@ elif st.session_state.stage == 3:
                         st.session_state["answers"][st.session_state["current_q"]] = st.session_state.current_selected_option
                     st.session_state["current_q"] += 1
                     st.rerun()
+            elif not st.session_state["generation"]["done"]:
+                # The next question is still being generated: keep the selection and poll
+                if st.session_state.current_selected_option:
+                    st.session_state["answers"][st.session_state["current_q"]] = st.session_state.current_selected_option
+                st.info("⏳ Next question is on its way...")
+                time.sleep(1)
+                st.rerun()
             else:
                 if st.button("Submit Quiz ✅"):
                     # Save the final answer and transition to the results page
@@ -677,6 +651,8 @@ elif st.session_state.stage == 3:
                         st.session_state["answers"][st.session_state["current_q"]] = st.session_state.current_selected_option
                     # Set flag to indicate quiz submission
                     st.session_state["quiz_submitted"] = True 
+                    # Sent with every evaluation attempt of this quiz, so a retried submit is recorded once
+                    st.session_state["submit_id"] = uuid.uuid4().hex
                     st.session_state["current_q"] += 1 # A dummy value to trigger the next block
                     st.session_state.stage = 4
                     st.rerun()
@@ -698,28 +674,14 @@ elif st.session_state.stage == 4:
     
 
     def display_performance_report(evaluation_results, questions):
-        total = len(evaluation_results)
-        correct = sum(r["is_correct"] for r in evaluation_results)
-        incorrect = total - correct
-        accuracy = (correct / total) * 100 if total > 0 else 0
-
-        # Aggregate performance by subject and topic
-        subj_stats = {}
-        topic_stats = {}
-
-        for r in evaluation_results:
-            subj = r["subject"]
-            topic = r["topic"]
-
-            subj_stats.setdefault(subj, {"total": 0, "correct": 0})
-            topic_stats.setdefault(topic, {"total": 0, "correct": 0})
-
-            subj_stats[subj]["total"] += 1
-            topic_stats[topic]["total"] += 1
-
-            if r["is_correct"]:
-                subj_stats[subj]["correct"] += 1
-                topic_stats[topic]["correct"] += 1
+        # Aggregate performance by subject and topic (same numbers as the backend report)
+        stats = compute_performance_stats(evaluation_results)
+        total = stats["total"]
+        correct = stats["correct"]
+        incorrect = stats["incorrect"]
+        accuracy = stats["accuracy"]
+        subj_stats = stats["by_subject"]
+        topic_stats = stats["by_topic"]
 
         # Header
         st.markdown("## 📊 Quiz Performance Report")
@@ -795,16 +757,16 @@ elif st.session_state.stage == 4:
         if "evaluation_results" not in st.session_state or "performance_report" not in st.session_state:
             
             with st.spinner("Evaluating quiz, generating performance report, and updating database..."):
-                final_state = run_quiz_evaluation_agent(
+                final_state = api.evaluate_quiz(
                     student_id=st.session_state.get("student_id"),
                     questions=st.session_state["questions"],
                     answers=st.session_state["answers"],
                     language=st.session_state.get("preferred_language", "English"),
-                    data_store=data_store,
                     class_selected=st.session_state.get("class"),
                     selected_subject=st.session_state.get("subject"),
                     general_topics=st.session_state.get("general_topics", []),
-                    auto_detect=st.session_state.get("auto_detect", False)
+                    auto_detect=st.session_state.get("auto_detect", False),
+                    submit_id=st.session_state.get("submit_id"),
                 )
 
                 # Save results to session state
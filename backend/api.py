@@ -0,0 +1,274 @@
+# backend/api.py
+# FastAPI service exposing quiz generation, evaluation and student performance.
+# Run with:  uvicorn backend.api:app --host 0.0.0.0 --port 8000 --workers 4
+#
+# Every worker process shares, across all of its requests: the compiled LangGraph
+# workflows, one LLM client, one MongoDB connection pool and one RAG vector store.
+
+import os
+import json
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Union
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from backend.student_data import AsyncDataStore
+from backend.rag_vector_store import (
+    load_or_build_rag_db,
+    reload_rag_db_if_changed,
+    rag_context_cache,
+    RAG_SAMPLE_DOCUMENTS,
+)
+from backend.llm_client import get_llm
+from backend.graph_registry import get_compiled_graph
+from backend.langgraph_workflow import (
+    arun_quiz_generation_agent,
+    astream_quiz_generation_agent,
+    build_quiz_generation_graph,
+)
+from backend.quiz_evaluation_graph import arun_quiz_evaluation_agent, build_quiz_evaluation_graph
+from backend.question_bank import QuestionBank, aassemble_quiz, astream_assembled_quiz, arefill_question_bank
+
+load_dotenv()
+
+
+# Maximum number of quiz generations/evaluations running at once in this worker;
+# further requests wait for a free slot instead of piling up on the LLM API.
+MAX_CONCURRENT_JOBS = int(os.getenv("API_MAX_CONCURRENT_JOBS", "32"))
+
+# Seconds between background top-ups of the most requested question bank buckets
+QUESTION_BANK_REFILL_INTERVAL = float(os.getenv("QUESTION_BANK_REFILL_INTERVAL", "600"))
+
+# Seconds between checks for a new RAG index version published by an ingestion run
+RAG_RELOAD_INTERVAL = float(os.getenv("RAG_RELOAD_INTERVAL", "30"))
+
+
+
+# ======================= REQUEST MODELS =======================
+
+class GenerateQuizRequest(BaseModel):
+    n: int = Field(5, ge=1, le=30)
+    class_name: str
+    subject: Union[str, List[str]]
+    language: str = "English"
+    include_rag: bool = False
+    use_bank: bool = True  # serve from the question bank first, generate only what is missing
+
+
+class EvaluateQuizRequest(BaseModel):
+    student_id: str
+    questions: List[Dict[str, Any]]
+    answers: List[Optional[str]]
+    language: str = "English"
+    class_selected: str
+    selected_subject: Union[str, List[str], None] = None
+    general_topics: List[str] = []
+    auto_detect: bool = False
+    llm_report: bool = False
+    submit_id: Optional[str] = Field(None, max_length=64)  # client-chosen: a retried submit is recorded once
+
+
+
+# ======================= APP LIFECYCLE =======================
+
+async def watch_rag_index(app: FastAPI):
+    """
+    Swaps in the new vector store whenever documents are ingested, without a restart.
+    Requests already running keep the store they started with.
+    """
+    while True:
+        await asyncio.sleep(RAG_RELOAD_INTERVAL)
+        try:
+            app.state.vector_store = await asyncio.to_thread(
+                reload_rag_db_if_changed, app.state.vector_store, os.getenv("GOOGLE_API_KEY")
+            )
+        except Exception as e:
+            print(f"❌ Error reloading RAG index: {e}")
+
+
+async def refill_question_bank(app: FastAPI):
+    """
+    Keeps popular question bank buckets stocked, off the students' request path.
+    Every worker runs this loop; the refill lease lets only one of them refill at a time.
+    """
+    while True:
+        await asyncio.sleep(QUESTION_BANK_REFILL_INTERVAL)
+        try:
+            await arefill_question_bank(app.state.question_bank, app.state.vector_store, jobs=app.state.jobs)
+        except Exception as e:
+            print(f"❌ Error refilling question bank: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the shared resources once per worker process.
+    """
+    app.state.data_store = AsyncDataStore(os.getenv("MONGODB_URI"))
+    app.state.jobs = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+
+    # Warm up the shared graphs and LLM client before the first request
+    get_compiled_graph("quiz_generation", build_quiz_generation_graph)
+    get_compiled_graph("quiz_evaluation", build_quiz_evaluation_graph)
+    get_llm()
+
+    app.state.vector_store = None
+    try:
+        app.state.vector_store = await asyncio.to_thread(
+            load_or_build_rag_db, RAG_SAMPLE_DOCUMENTS, os.getenv("GOOGLE_API_KEY")
+        )
+        print("✅ RAG knowledge base initialized successfully!")
+    except Exception as e:
+        print(f"❌ Error initializing RAG knowledge base (RAG disabled): {e}")
+    rag_watcher = asyncio.create_task(watch_rag_index(app))
+
+    app.state.question_bank = None
+    background_tasks = [rag_watcher]
+    try:
+        app.state.question_bank = await asyncio.to_thread(QuestionBank, app.state.data_store.sync.db)
+        background_tasks.append(asyncio.create_task(refill_question_bank(app)))
+    except Exception as e:
+        print(f"❌ Error initializing question bank (every quiz is generated): {e}")
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.to_thread(app.state.data_store.sync.close)
+
+
+app = FastAPI(title="AI Quiz Backend", lifespan=lifespan)
+
+
+
+# ======================= ENDPOINTS =======================
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "rag": app.state.vector_store is not None,
+        "rag_cache": rag_context_cache.stats(),
+        "student_cache": app.state.data_store.sync.cache_stats(),
+    }
+
+
+def _quiz_source(body: GenerateQuizRequest, request: Request):
+    # Question bank first when available, else the generation agent alone
+    bank = request.app.state.question_bank if body.use_bank else None
+    args = (body.n, body.class_name, body.subject, body.language, body.include_rag, request.app.state.vector_store)
+    return bank, args
+
+
+@app.post("/quiz/generate")
+async def generate_quiz(body: GenerateQuizRequest, request: Request):
+    """
+    Generates a full quiz and returns the parsed questions.
+    """
+    bank, args = _quiz_source(body, request)
+    async with request.app.state.jobs:
+        if bank is not None:
+            questions = await aassemble_quiz(bank, *args)
+        else:
+            questions = await arun_quiz_generation_agent(*args)
+    if not questions:
+        raise HTTPException(status_code=502, detail="Failed to generate questions.")
+    return {"questions": questions}
+
+
+@app.post("/quiz/generate/stream")
+async def stream_quiz(body: GenerateQuizRequest, request: Request):
+    """
+    Streams questions as newline-delimited JSON, one question per line,
+    as soon as each one has been generated and parsed.
+    """
+    bank, args = _quiz_source(body, request)
+
+    async def question_lines():
+        async with request.app.state.jobs:
+            questions = astream_assembled_quiz(bank, *args) if bank is not None else astream_quiz_generation_agent(*args)
+            async for question in questions:
+                yield json.dumps(question, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(question_lines(), media_type="application/x-ndjson")
+
+
+@app.post("/quiz/evaluate")
+async def evaluate_quiz(body: EvaluateQuizRequest, request: Request):
+    """
+    Grades a submitted quiz, builds the report and feedback, and updates the student record.
+    """
+    submit_id = body.submit_id or uuid.uuid4().hex
+    async with request.app.state.jobs:
+        final_state = await arun_quiz_evaluation_agent(
+            student_id=body.student_id,
+            questions=body.questions,
+            answers=body.answers,
+            language=body.language,
+            data_store=request.app.state.data_store,
+            class_selected=body.class_selected,
+            selected_subject=body.selected_subject,
+            general_topics=body.general_topics,
+            auto_detect=body.auto_detect,
+            llm_report=body.llm_report,
+            submit_id=submit_id,
+        )
+    return {
+        "questions": final_state["questions"],
+        "evaluation_results": final_state["evaluation_results"],
+        "performance_report": final_state["performance_report"],
+        "feedback": final_state["feedback"],
+    }
+
+
+@app.get("/students/{student_id:path}/performance")
+async def get_student_performance(student_id: str, request: Request):
+    """
+    Returns the stored performance document, or 404 for a new student.
+    """
+    performance = await request.app.state.data_store.get_student_performance(student_id)
+    if performance is None:
+        raise HTTPException(status_code=404, detail="Student not found.")
+    performance.pop("_id", None)  # ObjectId is not JSON serializable
+    return performance
+
+
+@app.get("/students/{student_id:path}/summary")
+async def get_student_summary(student_id: str, request: Request):
+    """
+    Returns class, overall totals and per-subject totals (no topics), or 404 for a new student.
+    """
+    summary = await request.app.state.data_store.get_student_summary(student_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Student not found.")
+    return summary
+
+
+@app.get("/students/{student_id:path}/topics")
+async def get_subject_topics(student_id: str, subject: str, request: Request):
+    """
+    Returns {topic: {"total_attempts", "correct_count"}} for one subject (?subject=...).
+    """
+    return await request.app.state.data_store.get_subject_topics(student_id, subject)
+
+
+@app.get("/students/{student_id:path}/accuracy")
+async def get_recent_accuracy(student_id: str, request: Request, days: int = Query(7, ge=1, le=365),
+                              by_topic: bool = False):
+    """
+    Accuracy per subject (or subject/topic) over the last `days` days, weakest first.
+    """
+    return await request.app.state.data_store.get_recent_accuracy(student_id, days, by_topic)
+
+
+@app.get("/students/{student_id:path}/weakest-topics")
+async def get_weakest_topics(student_id: str, request: Request, max_topics: int = Query(3, ge=1, le=20)):
+    """
+    "Subject - Topic" selection for an auto-detect quiz (empty for a student without attempts).
+    """
+    return {"topics": await request.app.state.data_store.get_weakest_topics(student_id, max_topics)}
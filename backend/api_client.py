@@ -0,0 +1,131 @@
+# backend/api_client.py
+# HTTP client used by the Streamlit UI to talk to the FastAPI backend (backend/api.py).
+
+import json
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import quote
+
+import requests
+
+
+
+class QuizApiClient:
+    def __init__(self, base_url: str, timeout: float = 120.0):
+        """
+        Args:
+            base_url (str): API root, e.g. "http://localhost:8000" (API_URL in .env).
+            timeout (float): seconds to wait for a response.
+
+        One requests.Session is kept for the lifetime of the client, so
+        connections to the API are reused across calls.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _student_url(self, student_id: str, resource: str) -> str:
+        # Student IDs are user input: "/", "?" or "#" must not change the route
+        return f"{self.base_url}/students/{quote(student_id, safe='')}/{resource}"
+
+    def generate_quiz(self, n: int, class_name: str, subject, language: str, include_rag: bool) -> List[dict]:
+        """
+        Returns the full list of generated questions (empty list on failure).
+        """
+        response = self.session.post(
+            f"{self.base_url}/quiz/generate",
+            json={"n": n, "class_name": class_name, "subject": subject,
+                  "language": language, "include_rag": include_rag},
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            return []
+        return response.json()["questions"]
+
+    def stream_quiz(self, n: int, class_name: str, subject, language: str, include_rag: bool) -> Iterator[dict]:
+        """
+        Yields questions one by one as the API generates them.
+        """
+        with self.session.post(
+            f"{self.base_url}/quiz/generate/stream",
+            json={"n": n, "class_name": class_name, "subject": subject,
+                  "language": language, "include_rag": include_rag},
+            timeout=self.timeout,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    yield json.loads(line)
+
+    def evaluate_quiz(self, student_id: str, questions: List[dict], answers: List[Optional[str]], language: str,
+                      class_selected: str, selected_subject, general_topics: List[str],
+                      auto_detect: bool = False, submit_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns {"questions", "evaluation_results", "performance_report", "feedback"}.
+        submit_id identifies this submission: evaluating it again (a retry) does not
+        record the attempt twice.
+        """
+        response = self.session.post(
+            f"{self.base_url}/quiz/evaluate",
+            json={"student_id": student_id, "questions": questions, "answers": answers,
+                  "language": language, "class_selected": class_selected,
+                  "selected_subject": selected_subject, "general_topics": general_topics,
+                  "auto_detect": auto_detect, "submit_id": submit_id},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def get_student_performance(self, student_id: str) -> Optional[Dict]:
+        """
+        Returns the student performance document, or None if the student is new.
+        """
+        response = self.session.get(self._student_url(student_id, "performance"), timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def get_student_summary(self, student_id: str) -> Optional[Dict]:
+        """
+        Returns class, overall and per-subject totals (no topics), or None if the student is new.
+        """
+        response = self.session.get(self._student_url(student_id, "summary"), timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def get_subject_topics(self, student_id: str, subject: str) -> Dict[str, Dict]:
+        """
+        Returns {topic: {"total_attempts", "correct_count"}} for one subject.
+        """
+        response = self.session.get(
+            self._student_url(student_id, "topics"), params={"subject": subject}, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def get_recent_accuracy(self, student_id: str, days: int = 7, by_topic: bool = False) -> List[Dict]:
+        """
+        Returns [{"subject", ("topic",) "total_attempts", "correct_count", "accuracy"}, ...] for the last days.
+        """
+        response = self.session.get(
+            self._student_url(student_id, "accuracy"),
+            params={"days": days, "by_topic": by_topic},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def get_weakest_topics(self, student_id: str, max_topics: int = 3) -> List[str]:
+        """
+        Returns the "Subject - Topic" strings an auto-detect quiz should cover ([] if there is no history).
+        """
+        response = self.session.get(
+            self._student_url(student_id, "weakest-topics"),
+            params={"max_topics": max_topics},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["topics"]
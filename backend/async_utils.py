@@ -0,0 +1,52 @@
+# backend/async_utils.py
+# Helpers that let the synchronous entry points (Streamlit, scripts) drive the async backend.
+#
+# All sync callers share ONE long-lived event loop running in a daemon thread instead of
+# calling asyncio.run() per request: async LLM/gRPC clients bind to the loop they were
+# first used on, so a fresh loop per call would break them on the second request.
+
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Coroutine, Iterator, Optional
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is not None:
+        return _loop
+
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="backend-async-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+
+def run_sync(coroutine: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Runs a coroutine on the shared background loop and blocks until it finishes.
+    Safe to call from any thread that is not itself the background loop.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_background_loop()).result()
+
+
+
+def iterate_sync(async_iterator: AsyncIterator[Any]) -> Iterator[Any]:
+    """
+    Turns an async iterator into a blocking one, pulling each item through the shared loop.
+    """
+    async def next_item():
+        return await async_iterator.__anext__()
+
+    while True:
+        try:
+            yield run_sync(next_item())
+        except StopAsyncIteration:
+            return
@@ -0,0 +1,153 @@
+# backend/embedding_cache.py
+# Persistent, content-addressed cache in front of an embeddings model.
+# Vectors are stored in SQLite keyed by sha256(model, kind, text), so unchanged chunks
+# and repeated queries never reach the embeddings API again, across restarts.
+
+import os
+import sqlite3
+import hashlib
+import inspect
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+
+# SQLite limits the number of "?" parameters per statement
+_LOOKUP_BATCH = 500
+
+# Concurrent embed_query calls for query misses when the model has no batched query embedding
+_QUERY_CONCURRENCY = 8
+
+
+
+def embedding_cache_key(model: str, kind: str, text: str) -> str:
+    """
+    kind is "document" or "query": many models (Gemini included) embed the two differently.
+    """
+    return hashlib.sha256(f"{model}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, underlying: Embeddings, model: str, cache_path: str):
+        """
+        Args:
+            underlying (Embeddings): the real embeddings model (e.g. GoogleGenerativeAIEmbeddings).
+            model (str): model name, part of every cache key.
+            cache_path (str): SQLite file holding the cached vectors.
+        """
+        self.underlying = underlying
+        self.model = model
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    # ---------------- storage ----------------
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start:start + _LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()],
+            )
+            self._conn.commit()
+
+    # ---------------- Embeddings interface ----------------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts, calling the underlying model only for texts not cached yet
+        (each distinct text at most once per call).
+        """
+        keys = [embedding_cache_key(self.model, "document", text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        # Each distinct miss is embedded once; its repeats in the same call are served from it
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), vectors))
+            self._store(new_items)
+            cached.update(new_items)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_cache_key(self.model, "query", text)
+        cached = self._lookup([key])
+        if key in cached:
+            self.hits += 1
+            return cached[key]
+
+        self.misses += 1
+        vector = self.underlying.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    def _embed_query_batch(self, texts: List[str]) -> List[List[float]]:
+        # One batched request when the model can embed documents with the query task type
+        # (GoogleGenerativeAIEmbeddings can), otherwise concurrent embed_query calls
+        if len(texts) == 1:
+            return [self.underlying.embed_query(texts[0])]
+        if "task_type" in inspect.signature(self.underlying.embed_documents).parameters:
+            return self.underlying.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+        with ThreadPoolExecutor(max_workers=min(_QUERY_CONCURRENCY, len(texts))) as executor:
+            return list(executor.map(self.underlying.embed_query, texts))
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        embed_query for several queries, with a single cache lookup and a single
+        batched embedding call for the misses.
+        """
+        keys = [embedding_cache_key(self.model, "query", text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        # Each distinct miss is embedded once; its repeats in the same call are served from it
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            new_items = dict(zip(missing.keys(), self._embed_query_batch(list(missing.values()))))
+            self._store(new_items)
+            cached.update(new_items)
+
+        return [cached[key] for key in keys]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
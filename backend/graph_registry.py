@@ -0,0 +1,42 @@
+# backend/graph_registry.py
+# Process-wide registry of compiled LangGraph workflows, shared by every entry point.
+
+import threading
+from typing import Any, Callable, Dict
+
+
+_compiled_graphs: Dict[str, Any] = {}
+_registry_lock = threading.Lock()
+
+
+
+def get_compiled_graph(name: str, builder: Callable[[], Any]) -> Any:
+    """
+    Returns the compiled graph registered under `name`, building it with `builder`
+    the first time it is requested in this process.
+
+    Compiled graphs are stateless between invocations (the state is passed to
+    invoke()), so one instance can safely serve concurrent requests.
+    """
+    graph = _compiled_graphs.get(name)
+    if graph is not None:
+        return graph
+
+    with _registry_lock:
+        # Another thread may have built it while we were waiting for the lock
+        graph = _compiled_graphs.get(name)
+        if graph is None:
+            print(f"--- Graph Registry: Compiling '{name}' graph ---")
+            graph = builder()
+            _compiled_graphs[name] = graph
+    return graph
+
+
+
+def clear_compiled_graphs() -> None:
+    """
+    Drops every cached graph so the next request rebuilds it.
+    Useful after patching node functions (e.g. in benchmarks).
+    """
+    with _registry_lock:
+        _compiled_graphs.clear()
@@ -1,11 +1,14 @@
 # backend/quiz_agent.py
 
-from typing import TypedDict, List, Optional, Any
+from typing import TypedDict, List, Optional, Any, Iterator, AsyncIterator
 from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
 
 
-from backend.question_parser import generate_questions_with_langchain, evaluate_quiz_format, parse_questions
-from backend.rag_vector_store import get_rag_context
+from backend.question_parser import astream_questions_with_langchain, parse_quiz_text, QuizStreamParser
+from backend.rag_vector_store import aget_rag_context, rag_filters
+from backend.graph_registry import get_compiled_graph
+from backend.async_utils import run_sync, iterate_sync
 
 
 
@@ -27,34 +30,70 @@ class QuizState(TypedDict):
     evaluation_result: bool | None # Result of the format evaluation (True/False)
     retries: int                   # Counter for regeneration attempts
     vector_store: Any | None       # FAISS vector store object
+    partial_acceptance: bool       # Keep already-parsed questions and only regenerate the missing ones
+    new_questions: List[dict] | None  # Questions parsed from the latest raw_quiz_text
+    parse_errors: List[str]        # Per-question errors reported by the parser
 
 
 
 
 
-def generate_quiz_node(state: QuizState) -> QuizState:
+async def generate_quiz_node(state: QuizState) -> QuizState:
     """
     LangGraph node to generate quiz questions.
     Conditionally retrieves RAG context and passes it to the LLM.
+    Async, so a waiting LLM call does not hold a worker thread.
     """
     print("--- LangGraph Node: Generating Quiz Questions ---")
     
     
     rag_context = None
     if state["include_rag"] and state.get("vector_store"):
-        # Convert list subject to string if needed
-        query = state["subject"]
-        if isinstance(query, list):
-            query = ", ".join(query)
-        rag_context = get_rag_context(query, state["vector_store"], k=2)
+        # One query per topic (General / auto-detect lists), searched in a single batch,
+        # only among the chunks written for this class/subject
+        filters = rag_filters(state["class_name"], state["subject"])
+        rag_context = await aget_rag_context(state["subject"], state["vector_store"], k=2, filters=filters)
     
-    raw_text = generate_questions_with_langchain(
-        n=state["n"],
+    # Partial acceptance: only ask for the questions we are still missing
+    accepted = (state.get("parsed_questions") or []) if state.get("partial_acceptance") else []
+    missing = state["n"] - len(accepted)
+    if accepted:
+        print(f"--- Partial acceptance: keeping {len(accepted)} question(s), requesting {missing} more ---")
+
+    # Stream the LLM output and push every question that will be accepted to the
+    # "custom" stream as soon as it is complete (see stream_quiz_generation_agent).
+    # The evaluate/parse nodes re-parse the full text and reach the same result.
+    writer = get_stream_writer()
+    parser = QuizStreamParser()
+    seen = {q["question"].strip().lower() for q in accepted}
+    streamed = 0
+    chunks = []
+
+    def emit(questions):
+        nonlocal streamed
+        if not state.get("partial_acceptance"):
+            return  # without partial acceptance a retry may discard these questions
+        for q in questions:
+            key = q["question"].strip().lower()
+            if key in seen or streamed >= missing:
+                continue
+            seen.add(key)
+            streamed += 1
+            writer({"question": q})
+
+    async for chunk in astream_questions_with_langchain(
+        n=missing,
         class_name=state["class_name"],
         subject=state["subject"],
         language=state["language"],
-        rag_context=rag_context
-    )
+        rag_context=rag_context,
+        avoid_questions=[q["question"] for q in accepted]
+    ):
+        chunks.append(chunk)
+        emit(parser.feed(chunk))
+    emit(parser.close())
+
+    raw_text = "".join(chunks)
     return {**state, "raw_quiz_text": raw_text, "rag_context": rag_context, "retries": state["retries"]+1}
 
 
@@ -68,9 +107,13 @@ def evaluate_quiz_node(state: QuizState) -> QuizState:
     LangGraph node to evaluate the format of the raw generated quiz text.
     """
     print("--- LangGraph Node: Evaluating Quiz Format ---")
-    is_valid = evaluate_quiz_format(state["raw_quiz_text"])
+    # Format validation and extraction happen in the same single pass;
+    # the parse node reuses the extracted questions.
+    questions, errors = parse_quiz_text(state["raw_quiz_text"])
+    is_valid = len(questions) > 0
+    print(f"Format evaluation: {len(questions)} valid question(s), {len(errors)} rejected.")
     # Return a new state dictionary with updates
-    return {**state, "evaluation_result": is_valid}
+    return {**state, "evaluation_result": is_valid, "new_questions": questions, "parse_errors": errors}
 
 
 
@@ -85,14 +128,39 @@ def parse_quiz_node(state: QuizState) -> QuizState:
     raw_text = state["raw_quiz_text"]
     print(f"Raw text received for parsing (first 500 chars):\n{raw_text[:500]}...")
     
-    parsed = parse_questions(raw_text) 
-    print(f"Number of questions parsed by parse_questions: {len(parsed)}")
+    parsed = state.get("new_questions")
+    if parsed is None:
+        parsed, _ = parse_quiz_text(raw_text)
+    print(f"Number of questions parsed: {len(parsed)}")
+
+    if state.get("partial_acceptance"):
+        parsed = merge_accepted_questions(state.get("parsed_questions") or [], parsed, state["n"])
+        print(f"Number of questions accepted so far: {len(parsed)} of {state['n']}")
     
     return {**state, "parsed_questions": parsed}
 
 
 
 
+def merge_accepted_questions(accepted: List[dict], new_questions: List[dict], n: int) -> List[dict]:
+    """
+    Appends newly parsed questions to the already accepted ones, skipping duplicates,
+    until n questions are reached.
+    """
+    merged = list(accepted)
+    seen = {q["question"].strip().lower() for q in merged}
+    for q in new_questions:
+        if len(merged) >= n:
+            break
+        key = q["question"].strip().lower()
+        if key not in seen:
+            seen.add(key)
+            merged.append(q)
+    return merged
+
+
+
+
 
 
 
@@ -102,13 +170,22 @@ def decide_to_regenerate(state: QuizState) -> str:
     Conditional logic for the LangGraph.
     Decides whether to regenerate questions, end successfully, or end with failure.
     """
-    if state["evaluation_result"] and state.get("parsed_questions") and len(state["parsed_questions"]) > 0:
+    parsed = state.get("parsed_questions") or []
+
+    if state.get("partial_acceptance"):
+        if len(parsed) >= state["n"]:
+            print("--- LangGraph Decision: All requested questions accepted. Ending. ---")
+            return "end"
+    elif state["evaluation_result"] and len(parsed) > 0:
         print("--- LangGraph Decision: Quiz Format Valid and Parsed Successfully. Ending. ---")
         return "end"
     
     if state["retries"] < 3:
         print(f"--- LangGraph Decision: Quiz Format Invalid or Parsing Failed. Retrying ({state['retries']} of 3). ---")
         return "regenerate"
+    elif parsed:
+        print(f"--- LangGraph Decision: Max retries reached. Ending with {len(parsed)} of {state['n']} questions. ---")
+        return "end"
     else:
         print("--- LangGraph Decision: Max retries reached. Ending with failure. ---")
         return "fail"
@@ -151,13 +228,14 @@ def build_quiz_generation_graph():
 
 # --- FUNCTION TO RUN THE QUIZ GENERATION AGENT ---
 
-def run_quiz_generation_agent(n, class_name, subject, language, include_rag: bool, vector_store: Optional[Any] = None):
+def build_initial_state(n, class_name, subject, language, include_rag: bool, vector_store: Optional[Any] = None,
+                        partial_acceptance: bool = True, seed_questions: Optional[List[dict]] = None) -> QuizState:
     """
-    Runs the LangGraph agent to generate, evaluate, and parse quiz questions.
-    Returns the list of parsed questions or an empty list if generation fails.
+    Builds the initial LangGraph state for a quiz generation run.
+    seed_questions (e.g. from the question bank) count as already accepted: with partial
+    acceptance only the remaining n - len(seed_questions) are generated, without repeats.
     """
-    app = build_quiz_generation_graph()
-    initial_state = {
+    return {
         "n": n,
         "class_name": class_name,
         "subject": subject,
@@ -165,14 +243,30 @@ def run_quiz_generation_agent(n, class_name, subject, language, include_rag: boo
         "include_rag": include_rag,
         "rag_context": None,
         "raw_quiz_text": None,
-        "parsed_questions": [],
+        "parsed_questions": list(seed_questions or []),
         "evaluation_result": None,
         "retries": 0,
         "vector_store": vector_store,
+        "partial_acceptance": partial_acceptance,
+        "new_questions": None,
+        "parse_errors": [],
     }
 
-    # Use app.invoke() to get the final state directly
-    final_state = app.invoke(initial_state)
+
+async def arun_quiz_generation_agent(n, class_name, subject, language, include_rag: bool, vector_store: Optional[Any] = None,
+                                     partial_acceptance: bool = True, seed_questions: Optional[List[dict]] = None) -> List[dict]:
+    """
+    Runs the LangGraph agent to generate, evaluate, and parse quiz questions.
+    With partial_acceptance, questions parsed on an earlier attempt are kept and
+    retries only ask the LLM for the missing ones.
+    Returns the list of parsed questions or an empty list if generation fails.
+    """
+    app = get_compiled_graph("quiz_generation", build_quiz_generation_graph)
+    initial_state = build_initial_state(n, class_name, subject, language, include_rag, vector_store,
+                                        partial_acceptance, seed_questions)
+
+    # Use app.ainvoke() to get the final state directly
+    final_state = await app.ainvoke(initial_state)
 
     print(f"\n--- Full final_state returned by run_quiz_generation_agent: {final_state}\n")
     print(f"--- run_quiz_generation_agent final_state['parsed_questions']: {final_state.get('parsed_questions')}")
@@ -181,3 +275,45 @@ def run_quiz_generation_agent(n, class_name, subject, language, include_rag: boo
     if final_state and isinstance(final_state.get("parsed_questions"), list):
         return final_state["parsed_questions"]
     return []
+
+
+def run_quiz_generation_agent(n, class_name, subject, language, include_rag: bool, vector_store: Optional[Any] = None,
+                              partial_acceptance: bool = True, seed_questions: Optional[List[dict]] = None) -> List[dict]:
+    """
+    Synchronous wrapper around arun_quiz_generation_agent.
+    """
+    return run_sync(arun_quiz_generation_agent(n, class_name, subject, language, include_rag, vector_store,
+                                               partial_acceptance, seed_questions))
+
+
+
+
+# --- STREAMING VARIANT: YIELD QUESTIONS AS SOON AS THEY ARE PARSED ---
+
+async def astream_quiz_generation_agent(n, class_name, subject, language, include_rag: bool,
+                                        vector_store: Optional[Any] = None,
+                                        seed_questions: Optional[List[dict]] = None) -> AsyncIterator[dict]:
+    """
+    Runs the same LangGraph agent as arun_quiz_generation_agent, but yields each
+    question as soon as it has been generated and parsed, so the UI can show
+    question 1 while the rest are still being generated.
+    Partial acceptance is always on, so a yielded question is never discarded by a retry.
+    seed_questions are not yielded; only the newly generated remainder is.
+    """
+    app = get_compiled_graph("quiz_generation", build_quiz_generation_graph)
+    initial_state = build_initial_state(n, class_name, subject, language, include_rag, vector_store,
+                                        partial_acceptance=True, seed_questions=seed_questions)
+
+    async for event in app.astream(initial_state, stream_mode="custom"):
+        if isinstance(event, dict) and "question" in event:
+            yield event["question"]
+
+
+def stream_quiz_generation_agent(n, class_name, subject, language, include_rag: bool,
+                                 vector_store: Optional[Any] = None,
+                                 seed_questions: Optional[List[dict]] = None) -> Iterator[dict]:
+    """
+    Synchronous wrapper around astream_quiz_generation_agent.
+    """
+    yield from iterate_sync(astream_quiz_generation_agent(n, class_name, subject, language, include_rag, vector_store,
+                                                          seed_questions))
@@ -0,0 +1,109 @@
+# backend/llm_client.py
+# Shared LLM client factory used by every backend module.
+# Clients are created once per (backend, model, settings) and reused, so the
+# underlying HTTP/gRPC connections stay open across quizzes.
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+# Per-model defaults, overridable per call through get_llm(**overrides)
+MODEL_CONFIGS: Dict[str, Dict[str, Any]] = {
+    "gemini-2.5-flash": {"temperature": 0.7},
+}
+
+
+
+def _build_gemini_llm(model: str, **settings):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError(
+            "Google Gemini API Key not found. "
+            "Please set the GOOGLE_API_KEY environment variable "
+            "or add it to a .env file in the root directory."
+        )
+    return ChatGoogleGenerativeAI(model=model, google_api_key=api_key, **settings)
+
+
+_fake_responses: List[str] = ["Fake LLM response."]
+
+def _build_fake_llm(model: str, **settings):
+    # Local, offline chat model that cycles through canned responses.
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    return FakeListChatModel(responses=list(_fake_responses))
+
+
+
+_backends: Dict[str, Callable[..., Any]] = {
+    "gemini": _build_gemini_llm,
+    "fake": _build_fake_llm,
+}
+_active_backend = os.getenv("LLM_BACKEND", "gemini")
+
+_clients: Dict[Tuple, Any] = {}
+_clients_lock = threading.Lock()
+
+
+
+def get_llm(model: Optional[str] = None, **overrides):
+    """
+    Returns the shared chat model for `model` (default: DEFAULT_MODEL).
+    Settings come from MODEL_CONFIGS and can be overridden per call, e.g.
+    get_llm(temperature=0). Each distinct configuration is built only once.
+    """
+    model = model or DEFAULT_MODEL
+    settings = {**MODEL_CONFIGS.get(model, {}), **overrides}
+    key = (_active_backend, model, tuple(sorted(settings.items())))
+
+    llm = _clients.get(key)
+    if llm is not None:
+        return llm
+
+    with _clients_lock:
+        llm = _clients.get(key)
+        if llm is None:
+            print(f"--- LLM Client: Creating '{_active_backend}' client for {model} {settings} ---")
+            llm = _backends[_active_backend](model, **settings)
+            _clients[key] = llm
+    return llm
+
+
+
+def register_llm_backend(name: str, factory: Callable[..., Any]) -> None:
+    """
+    Registers a backend factory. The factory is called as factory(model, **settings)
+    and must return a LangChain chat model.
+    """
+    _backends[name] = factory
+
+
+def set_llm_backend(name: str) -> None:
+    """
+    Switches every module to another registered backend ("gemini", "fake", ...).
+    Existing clients are dropped so the next get_llm() builds from the new backend.
+    """
+    global _active_backend
+    if name not in _backends:
+        raise ValueError(f"Unknown LLM backend '{name}'. Registered: {sorted(_backends)}")
+    with _clients_lock:
+        _active_backend = name
+        _clients.clear()
+
+
+def use_fake_llm(responses: List[str]) -> None:
+    """
+    Switches to the local fake backend, answering with `responses` in order (cycling).
+    """
+    global _fake_responses
+    _fake_responses = list(responses)
+    set_llm_backend("fake")
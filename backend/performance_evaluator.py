@@ -1,41 +1,28 @@
 # backend/performance_evaluator.py
 # used to generate personalized feedback, performance report, and evaluate performance
 
-import os
 import json
-import streamlit as st
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
 
-load_dotenv()
+# Shared client from the LLM factory (created once per process, reused by every call)
+from backend.llm_client import get_llm
+from backend.async_utils import run_sync
 
-# Initialize once at the module level for reuse
-api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
-    raise ValueError("Google API Key not found. Please set GOOGLE_API_KEY in your environment.")
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.7, google_api_key=api_key)
 
 
-
-def extract_or_generate_subject_topic(question_text: str, class_selected: str, selected_subject, general_topics : list) -> tuple:
-    """
-    Decide subject/topic for a question.
-    - In General mode: prompt with topics list.
-    - In specific-subject mode: prompt with class+subject.
-    """
+def _subject_topic_prompt(question_text: str, class_selected: str, selected_subject, general_topics: list) -> str:
     # Detect general mode: topics list provided
     is_general_mode = isinstance(selected_subject, list) or bool(general_topics)
 
     if is_general_mode:
-        prompt = f"""
+        return f"""
         You are given learning level: "{class_selected}".
         Topics: {selected_subject}
         Based on the following quiz question, identify and confirm subject and most relevant topic.
         Question: {question_text}
         Respond only as JSON: {{ "subject": "...", "topic": "..." }}
         """
-    else:
-        prompt = f""" you are given :
+    return f""" you are given :
         Class: "{class_selected}"
         Subject: "{selected_subject}"
         Based on the following quiz question, identify the most appropriate topic within this subject.
@@ -44,17 +31,111 @@ def extract_or_generate_subject_topic(question_text: str, class_selected: str, s
         Respond only as JSON: {{ "subject": "{selected_subject}", "topic": "..." }}
         """
 
+
+def _parse_subject_topic(response: str, selected_subject) -> tuple:
+    start, end = response.find("{"), response.rfind("}") + 1
+    result = json.loads(response[start:end])
+    subject = result.get("subject", selected_subject if selected_subject else "Unknown")
+    topic = result.get("topic", "Unknown")
+    return subject, topic
+
+
+async def aextract_or_generate_subject_topic(question_text: str, class_selected: str, selected_subject, general_topics: list) -> tuple:
+    """
+    Decide subject/topic for a question.
+    - In General mode: prompt with topics list.
+    - In specific-subject mode: prompt with class+subject.
+    """
+    prompt = _subject_topic_prompt(question_text, class_selected, selected_subject, general_topics)
     try:
-        response = llm.predict(prompt)
-        start, end = response.find("{"), response.rfind("}") + 1
-        result = json.loads(response[start:end])
-        subject = result.get("subject", selected_subject if selected_subject else "Unknown")
-        topic = result.get("topic", "Unknown")
+        response = await get_llm().apredict(prompt)
+        return _parse_subject_topic(response, selected_subject)
     except Exception as e:
-        st.error(f"Error parsing subject/topic from LLM response: {e}")
-        subject, topic = (selected_subject if selected_subject else "Unknown"), "Unknown"
+        print(f"Error parsing subject/topic from LLM response: {e}")
+        return (selected_subject if selected_subject else "Unknown"), "Unknown"
 
-    return subject, topic
+
+def extract_or_generate_subject_topic(question_text: str, class_selected: str, selected_subject, general_topics : list) -> tuple:
+    """
+    Sync wrapper around aextract_or_generate_subject_topic.
+    """
+    return run_sync(aextract_or_generate_subject_topic(question_text, class_selected, selected_subject, general_topics))
+
+
+
+def _batch_classification_prompt(questions: list, class_selected: str, selected_subject, general_topics: list) -> str:
+    is_general_mode = isinstance(selected_subject, list) or bool(general_topics)
+    numbered = "\n".join(f"{i}. {q['question']}" for i, q in enumerate(questions, 1))
+
+    if is_general_mode:
+        return f"""
+        You are given learning level: "{class_selected}".
+        Topics: {selected_subject}
+        For each of the following quiz questions, identify and confirm subject and most relevant topic.
+
+        Questions:
+        {numbered}
+
+        Respond only as a JSON array with one object per question:
+        [{{ "index": 1, "subject": "...", "topic": "..." }}, ...]
+        """
+    return f""" you are given :
+        Class: "{class_selected}"
+        Subject: "{selected_subject}"
+        For each of the following quiz questions, identify the most appropriate topic within this subject.
+
+        Questions:
+        {numbered}
+
+        Respond only as a JSON array with one object per question:
+        [{{ "index": 1, "subject": "{selected_subject}", "topic": "..." }}, ...]
+        """
+
+
+def _parse_batch_classification(response: str, question_count: int, selected_subject) -> dict:
+    # Maps question position -> (subject, topic) for every well-formed item
+    classified = {}
+    start, end = response.find("["), response.rfind("]") + 1
+    for item in json.loads(response[start:end]):
+        index, topic = item.get("index"), item.get("topic")
+        if isinstance(index, int) and 1 <= index <= question_count and topic:
+            subject = item.get("subject") or (selected_subject if selected_subject else "Unknown")
+            classified[index - 1] = (subject, topic)
+    return classified
+
+
+async def aclassify_subject_topics_batch(questions: list, class_selected: str, selected_subject, general_topics: list) -> list:
+    """
+    Decide subject/topic for every question with a single LLM call.
+    The LLM answers with a JSON array indexed by question number; questions missing
+    from (or malformed in) the response fall back to aextract_or_generate_subject_topic,
+    concurrently. Returns a list of (subject, topic) tuples in question order.
+    """
+    if not questions:
+        return []
+
+    classified = {}
+    try:
+        response = await get_llm().apredict(_batch_classification_prompt(questions, class_selected, selected_subject, general_topics))
+        classified = _parse_batch_classification(response, len(questions), selected_subject)
+    except Exception as e:
+        print(f"Batch subject/topic classification failed, falling back per question: {e}")
+
+    missing = [i for i in range(len(questions)) if i not in classified]
+    fallbacks = await asyncio.gather(*(
+        aextract_or_generate_subject_topic(questions[i]["question"], class_selected, selected_subject, general_topics)
+        for i in missing
+    ))
+    classified.update(zip(missing, fallbacks))
+    print(f"Subject/topic: {len(questions) - len(missing)} of {len(questions)} classified in one batch call.")
+    return [classified[i] for i in range(len(questions))]
+
+
+def classify_subject_topics_batch(questions: list, class_selected: str, selected_subject, general_topics: list) -> list:
+    """
+    Sync wrapper around aclassify_subject_topics_batch.
+    """
+    return run_sync(aclassify_subject_topics_batch(questions, class_selected, selected_subject, general_topics))
     
 
 def evaluate_answers(questions: list, answers: list) -> list:
@@ -76,11 +157,132 @@ def evaluate_answers(questions: list, answers: list) -> list:
         })
     return results
 
-def generate_performance_report(evaluation_results: list, language: str = "English") -> str:
+# Labels for the locally built performance report. Reports in languages not listed
+# here are written by the LLM instead (see agenerate_performance_report).
+REPORT_LABELS = {
+    "English": {
+        "title": "Performance Report",
+        "total": "Total questions",
+        "correct": "Correct answers",
+        "incorrect": "Incorrect answers",
+        "accuracy": "Overall accuracy",
+        "by_subject": "Performance by subject",
+        "by_topic": "Performance by topic",
+        "line": "{name}: {correct} out of {total} correct ({pct:.0f}%)",
+    },
+    "Hindi": {
+        "title": "प्रदर्शन रिपोर्ट",
+        "total": "कुल प्रश्न",
+        "correct": "सही उत्तर",
+        "incorrect": "गलत उत्तर",
+        "accuracy": "कुल सटीकता",
+        "by_subject": "विषय के अनुसार प्रदर्शन",
+        "by_topic": "टॉपिक के अनुसार प्रदर्शन",
+        "line": "{name}: {total} में से {correct} सही ({pct:.0f}%)",
+    },
+    "Bengali": {
+        "title": "পারফরম্যান্স রিপোর্ট",
+        "total": "মোট প্রশ্ন",
+        "correct": "সঠিক উত্তর",
+        "incorrect": "ভুল উত্তর",
+        "accuracy": "সামগ্রিক নির্ভুলতা",
+        "by_subject": "বিষয় অনুযায়ী ফলাফল",
+        "by_topic": "টপিক অনুযায়ী ফলাফল",
+        "line": "{name}: {total}টির মধ্যে {correct}টি সঠিক ({pct:.0f}%)",
+    },
+    "Spanish": {
+        "title": "Informe de rendimiento",
+        "total": "Total de preguntas",
+        "correct": "Respuestas correctas",
+        "incorrect": "Respuestas incorrectas",
+        "accuracy": "Precisión general",
+        "by_subject": "Rendimiento por materia",
+        "by_topic": "Rendimiento por tema",
+        "line": "{name}: {correct} de {total} correctas ({pct:.0f}%)",
+    },
+    "French": {
+        "title": "Rapport de performance",
+        "total": "Nombre total de questions",
+        "correct": "Réponses correctes",
+        "incorrect": "Réponses incorrectes",
+        "accuracy": "Précision globale",
+        "by_subject": "Performance par matière",
+        "by_topic": "Performance par thème",
+        "line": "{name} : {correct} sur {total} correctes ({pct:.0f} %)",
+    },
+}
+
+
+def compute_performance_stats(evaluation_results: list) -> dict:
+    """
+    Computes quiz totals and per-subject / per-topic breakdowns in-process.
+    Each breakdown maps a name to {"total": int, "correct": int}.
+    """
+    total = len(evaluation_results)
+    correct = sum(1 for r in evaluation_results if r["is_correct"])
+
+    subj_stats = {}
+    topic_stats = {}
+    for r in evaluation_results:
+        subj = r.get("subject", "Unknown")
+        topic = r.get("topic", "Unknown")
+
+        subj_stats.setdefault(subj, {"total": 0, "correct": 0})
+        topic_stats.setdefault(topic, {"total": 0, "correct": 0})
+
+        subj_stats[subj]["total"] += 1
+        topic_stats[topic]["total"] += 1
+
+        if r["is_correct"]:
+            subj_stats[subj]["correct"] += 1
+            topic_stats[topic]["correct"] += 1
+
+    return {
+        "total": total,
+        "correct": correct,
+        "incorrect": total - correct,
+        "accuracy": (correct / total) * 100 if total > 0 else 0,
+        "by_subject": subj_stats,
+        "by_topic": topic_stats,
+    }
+
+
+def build_performance_report(evaluation_results: list, language: str = "English") -> str:
     """
-    Use Gemini LLM to generate a performance report in the specified language.
+    Builds the performance report from a template, without any network call.
+    Languages without REPORT_LABELS get English labels.
     """
-    prompt = f"""
+    labels = REPORT_LABELS.get(language, REPORT_LABELS["English"])
+    stats = compute_performance_stats(evaluation_results)
+
+    def breakdown(rows: dict) -> list:
+        return [
+            "- " + labels["line"].format(
+                name=name, correct=row["correct"], total=row["total"],
+                pct=(row["correct"] / row["total"]) * 100 if row["total"] else 0
+            )
+            for name, row in rows.items()
+        ]
+
+    lines = [
+        f"{labels['title']}",
+        "",
+        f"{labels['total']}: {stats['total']}",
+        f"{labels['correct']}: {stats['correct']}",
+        f"{labels['incorrect']}: {stats['incorrect']}",
+        f"{labels['accuracy']}: {stats['accuracy']:.1f}%",
+        "",
+        f"{labels['by_subject']}:",
+        *breakdown(stats["by_subject"]),
+        "",
+        f"{labels['by_topic']}:",
+        *breakdown(stats["by_topic"]),
+    ]
+    return "\n".join(lines)
+
+
+def _report_prompt(evaluation_results: list, language: str) -> str:
+    return f"""
     Given quiz results (JSON): {json.dumps(evaluation_results, indent=2)}
     Give a clear and concise performance report in {language} including:
     - Total questions
@@ -89,21 +291,34 @@ def generate_performance_report(evaluation_results: list, language: str = "Engli
     
     Respond with a formatted textual summary.        
     """
+
+
+async def agenerate_performance_report(evaluation_results: list, language: str = "English", use_llm: bool = False) -> str:
+    """
+    Generate a performance report in the specified language.
+    By default the report is built locally from a template (no LLM call) when
+    REPORT_LABELS has the language; use_llm=True, or any other language, asks Gemini
+    for a narrative report instead.
+    """
+    if not use_llm and language in REPORT_LABELS:
+        return build_performance_report(evaluation_results, language)
+
     try:
-        response = llm.predict(prompt)
-        return response
+        return await get_llm().apredict(_report_prompt(evaluation_results, language))
     except Exception as e:
-        st.error(f"Error generating performance report: {e}")
+        print(f"Error generating performance report: {e}")
         return "Failed to generate performance report."
 
 
-def generate_personalized_feedback(evaluation_results: list, language: str = "English") -> str:
+def generate_performance_report(evaluation_results: list, language: str = "English", use_llm: bool = False) -> str:
     """
-    Generate personalized, motivational, actionable feedback for the student 
-    based on detailed quiz evaluation results using the Gemini LLM.
+    Sync wrapper around agenerate_performance_report.
     """
+    return run_sync(agenerate_performance_report(evaluation_results, language, use_llm))
+
 
-    prompt = f"""
+def _feedback_prompt(evaluation_results: list, language: str) -> str:
+    return f"""
     You are an AI tutor analyzing a student's quiz performance.
 
     The quiz comprised {len(evaluation_results)} questions.
@@ -127,11 +342,21 @@ def generate_personalized_feedback(evaluation_results: list, language: str = "En
     Give the feedback in 3-5 concise paragraphs.
     """
 
+
+async def agenerate_personalized_feedback(evaluation_results: list, language: str = "English") -> str:
+    """
+    Generate personalized, motivational, actionable feedback for the student
+    based on detailed quiz evaluation results using the Gemini LLM.
+    """
     try:
-        response = llm.predict(prompt)
-        return response
+        return await get_llm().apredict(_feedback_prompt(evaluation_results, language))
     except Exception as e:
-        import streamlit as st
-        st.error(f"Error generating personalized feedback: {e}")
+        print(f"Error generating personalized feedback: {e}")
         return "Failed to generate personalized feedback."
 
+
+def generate_personalized_feedback(evaluation_results: list, language: str = "English") -> str:
+    """
+    Sync wrapper around agenerate_personalized_feedback.
+    """
+    return run_sync(agenerate_personalized_feedback(evaluation_results, language))
@@ -0,0 +1,275 @@
+# backend/question_bank.py
+# Persistent bank of generated questions in MongoDB (quiz_app.question_bank).
+#
+# Quizzes are assembled from the bank first and the LLM only generates what is missing;
+# every generated question is added to the bank, and a background job tops up the most
+# requested buckets so popular quizzes rarely wait on the LLM. Only one API worker refills
+# at a time: the run holds a lease document in quiz_app.question_bank_leases.
+
+import os
+import time
+import socket
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+from backend.langgraph_workflow import arun_quiz_generation_agent, astream_quiz_generation_agent
+
+
+# Buckets a refill run tops up, and the stock it aims for in each
+REFILL_BUCKETS = 20
+REFILL_TARGET = 60
+REFILL_BATCH = 10
+
+# Seconds a refill lease lasts; the running refill renews it before every bucket
+REFILL_LEASE_SECONDS = 900
+
+
+
+def _normalize(text) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def question_hash(question: Dict) -> str:
+    """
+    Content hash of a question: normalized question text and options.
+    """
+    options = question.get("options") or {}
+    parts = [_normalize(question.get("question", ""))] + [f"{key}:{_normalize(value)}" for key, value in sorted(options.items())]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def bucket_key(class_name: str, subject_item: str, language: str) -> str:
+    """
+    Bucket of a single subject (or "Subject - Topic" / General topic) for a class and language.
+    """
+    return "|".join(_normalize(part) for part in (class_name, subject_item, language))
+
+
+def subject_items(subject) -> List[str]:
+    items = subject if isinstance(subject, (list, tuple)) else [subject]
+    return [str(item) for item in items if item and str(item).strip()]
+
+
+def split_quota(n: int, items: List[str]) -> List[Tuple[str, int]]:
+    """
+    Spreads n questions over the items as evenly as possible (earlier items get the extra ones).
+    """
+    base, extra = divmod(n, len(items))
+    return [(item, base + (1 if i < extra else 0)) for i, item in enumerate(items)]
+
+
+def _matching_item(question: Dict, items: List[str]) -> str:
+    # Bucket a generated question by its Subject/Topic tags; default to the first item
+    subject = _normalize(question.get("subject", ""))
+    topic = _normalize(question.get("topic", ""))
+    for item in items:
+        item_subject, _, item_topic = item.partition(" - ")
+        if _normalize(item_subject) == subject and (not item_topic or _normalize(item_topic) == topic):
+            return item
+    return items[0]
+
+
+
+class QuestionBank:
+    def __init__(self, db: Database):
+        """
+        Args:
+            db (Database): the quiz_app database (DataStore.db).
+
+        Collections:
+            question_bank: one document per question and bucket, unique on (bucket, content_hash)
+            question_bank_buckets: request counters per bucket, used to pick buckets to refill
+            question_bank_leases: {_id: lease name, owner, expires_at}, one document per lease
+        """
+        self.questions = db["question_bank"]
+        self.buckets = db["question_bank_buckets"]
+        self.leases = db["question_bank_leases"]
+        self.questions.create_index([("bucket", 1), ("content_hash", 1)], unique=True)
+        self.buckets.create_index([("requests", -1)])
+
+    def add_questions(self, class_name: str, subject_item: str, language: str, questions: List[Dict]) -> int:
+        """
+        Stores questions in the bucket, skipping ones already there. Returns how many were new.
+        """
+        if not questions:
+            return 0
+        bucket = bucket_key(class_name, subject_item, language)
+        now = time.time()
+        operations = [
+            UpdateOne(
+                {"bucket": bucket, "content_hash": question_hash(q)},
+                {"$setOnInsert": {
+                    "class": class_name, "subject": subject_item, "language": language,
+                    "topic": q.get("topic"), "question": q, "created_at": now,
+                }},
+                upsert=True,
+            )
+            for q in questions
+        ]
+        return self.questions.bulk_write(operations, ordered=False).upserted_count
+
+    def sample(self, class_name: str, subject_item: str, language: str, n: int) -> List[Dict]:
+        """
+        Returns up to n random questions from the bucket.
+        """
+        if n <= 0:
+            return []
+        cursor = self.questions.aggregate([
+            {"$match": {"bucket": bucket_key(class_name, subject_item, language)}},
+            {"$sample": {"size": n}},
+            {"$project": {"_id": 0, "question": 1}},
+        ])
+        return [doc["question"] for doc in cursor]
+
+    def count(self, class_name: str, subject_item: str, language: str) -> int:
+        return self.questions.count_documents({"bucket": bucket_key(class_name, subject_item, language)})
+
+    def record_request(self, class_name: str, subject_item: str, language: str) -> None:
+        self.buckets.update_one(
+            {"bucket": bucket_key(class_name, subject_item, language)},
+            {
+                "$inc": {"requests": 1},
+                "$set": {"last_requested": time.time()},
+                "$setOnInsert": {"class": class_name, "subject": subject_item, "language": language},
+            },
+            upsert=True,
+        )
+
+    def popular_buckets(self, limit: int = REFILL_BUCKETS) -> List[Dict]:
+        return list(self.buckets.find({}, {"_id": 0}).sort("requests", -1).limit(limit))
+
+    def acquire_lease(self, name: str, owner: str, seconds: float) -> bool:
+        """
+        Takes (or renews, for the same owner) the named lease for `seconds`.
+        Returns False while another owner holds an unexpired lease.
+        """
+        now = time.time()
+        try:
+            # No match means the lease is held by someone else: the upsert then collides on _id
+            self.leases.find_one_and_update(
+                {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": owner, "expires_at": now + seconds}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self.leases.delete_one({"_id": name, "owner": owner})
+
+
+
+# ======================= QUIZ ASSEMBLY =======================
+
+async def asample_quiz(bank: QuestionBank, n: int, class_name: str, subject, language: str) -> List[Dict]:
+    """
+    Draws up to n questions from the bank, spread over the requested subjects/topics.
+    """
+    def sample():
+        questions = []
+        for item, quota in split_quota(n, subject_items(subject)):
+            bank.record_request(class_name, item, language)
+            questions.extend(bank.sample(class_name, item, language, quota))
+        return questions
+
+    return await asyncio.to_thread(sample)
+
+
+async def astore_generated(bank: QuestionBank, class_name: str, subject, language: str, questions: List[Dict]) -> None:
+    items = subject_items(subject)
+    by_item = {}
+    for q in questions:
+        by_item.setdefault(_matching_item(q, items), []).append(q)
+
+    def store():
+        for item, item_questions in by_item.items():
+            bank.add_questions(class_name, item, language, item_questions)
+
+    await asyncio.to_thread(store)
+
+
+async def aassemble_quiz(bank: QuestionBank, n: int, class_name: str, subject, language: str, include_rag: bool,
+                         vector_store: Optional[Any] = None) -> List[Dict]:
+    """
+    Cache-first quiz: questions come from the bank, and the generation agent only
+    generates the ones still missing (which are then added to the bank).
+    """
+    banked = await asample_quiz(bank, n, class_name, subject, language)
+    if len(banked) >= n:
+        print(f"--- Question bank: served all {n} questions ---")
+        return banked
+
+    print(f"--- Question bank: served {len(banked)} of {n} questions, generating the rest ---")
+    questions = await arun_quiz_generation_agent(n, class_name, subject, language, include_rag, vector_store,
+                                                 seed_questions=banked)
+    await astore_generated(bank, class_name, subject, language, questions[len(banked):])
+    return questions
+
+
+async def astream_assembled_quiz(bank: QuestionBank, n: int, class_name: str, subject, language: str,
+                                 include_rag: bool, vector_store: Optional[Any] = None) -> AsyncIterator[Dict]:
+    """
+    Streaming version of aassemble_quiz: banked questions are yielded immediately,
+    generated ones as soon as they are parsed.
+    """
+    banked = await asample_quiz(bank, n, class_name, subject, language)
+    for question in banked:
+        yield question
+    if len(banked) >= n:
+        return
+
+    generated = []
+    try:
+        async for question in astream_quiz_generation_agent(n, class_name, subject, language, include_rag,
+                                                            vector_store, seed_questions=banked):
+            generated.append(question)
+            yield question
+    finally:
+        await astore_generated(bank, class_name, subject, language, generated)
+
+
+
+# ======================= BACKGROUND REFILL =======================
+
+async def arefill_question_bank(bank: QuestionBank, vector_store: Optional[Any] = None,
+                                buckets: int = REFILL_BUCKETS, target: int = REFILL_TARGET,
+                                batch: int = REFILL_BATCH, jobs: Optional[asyncio.Semaphore] = None,
+                                lease_seconds: float = REFILL_LEASE_SECONDS) -> int:
+    """
+    Tops up the most requested buckets that hold fewer than `target` questions,
+    generating at most `batch` questions per bucket per run. Returns how many were added.
+
+    The run holds the "refill" lease, renewed before every bucket, and does nothing
+    (or stops early) while another worker holds it. Each bucket's generation takes a
+    slot of `jobs` (the worker's job semaphore), so a refill never holds more than one.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    jobs = jobs or asyncio.Semaphore(1)
+    added = 0
+    try:
+        for entry in await asyncio.to_thread(bank.popular_buckets, buckets):
+            if not await asyncio.to_thread(bank.acquire_lease, "refill", owner, lease_seconds):
+                print("--- Question bank refill running in another worker, skipping ---")
+                break
+            class_name, item, language = entry["class"], entry["subject"], entry["language"]
+            stock = await asyncio.to_thread(bank.count, class_name, item, language)
+            if stock >= target:
+                continue
+
+            existing = await asyncio.to_thread(bank.sample, class_name, item, language, min(stock, 30))
+            wanted = min(batch, target - stock)
+            async with jobs:
+                questions = await arun_quiz_generation_agent(len(existing) + wanted, class_name, item, language,
+                                                             include_rag=vector_store is not None,
+                                                             vector_store=vector_store, seed_questions=existing)
+            added += await asyncio.to_thread(bank.add_questions, class_name, item, language, questions[len(existing):])
+    finally:
+        await asyncio.to_thread(bank.release_lease, "refill", owner)
+    print(f"--- Question bank refill: added {added} questions ---")
+    return added
@@ -1,111 +1,274 @@
 # backend/quiz_core.py
 
-import os
 import re
-from typing import Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-def create_question_generator_chain(rag_context: Optional[str] = None):
-    
-    api_key = os.getenv("GOOGLE_API_KEY")
-
-    if not api_key:
-        raise ValueError(
-            "Google Gemini API Key not found. "
-            "Please set the GOOGLE_API_KEY environment variable "
-            "or add it to a .env file in the root directory."
-        )
-    
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.7, google_api_key=api_key)
-    
-    
-    base_template = """
+from backend.llm_client import get_llm
+from backend.async_utils import run_sync, iterate_sync
+
+
+QUIZ_TEMPLATE = """
     You are an AI quiz generator. Generate {n} multiple-choice questions for a student of {class_name}.
     Topic(s): {subject_str}
-    """
-    if rag_context:
-        base_template += f"\nUse this context: {rag_context}\n"
-    
-    base_template += """
+    {rag_block}{avoid_block}
     Each question must have exactly four options (A, B, C, D) and one correct answer.
     The quiz must be in Language: {language}
 
+    For every question also give its subject and the specific topic within that subject.
+
     Format:
     1. Question: ...
+    Subject: ...
+    Topic: ...
     A. ...
     B. ...
     C. ...
     D. ...
     Answer: A
     """
-    prompt_template = PromptTemplate(
-        input_variables=["n", "class_name", "subject_str", "language"],
-        template=base_template
-    )
+
+# The prompt is built once; optional sections (RAG context, questions to avoid) are
+# passed as variables instead of being baked into the template, so one chain serves
+# every quiz.
+QUIZ_PROMPT = PromptTemplate(
+    input_variables=["n", "class_name", "subject_str", "language", "rag_block", "avoid_block"],
+    template=QUIZ_TEMPLATE
+)
+
+_chain_cache = {}
 
 
-    chain = prompt_template | llm | StrOutputParser()
+
+def create_question_generator_chain(rag_context: Optional[str] = None):
+    """
+    Returns the question generator chain, reusing the shared LLM client.
+    The chain expects "rag_block" and "avoid_block" inputs (empty strings when unused);
+    rag_context is kept for backward compatibility and no longer changes the chain.
+    """
+    llm = get_llm()
+    chain = _chain_cache.get(id(llm))
+    if chain is None:
+        chain = QUIZ_PROMPT | llm | StrOutputParser()
+        _chain_cache[id(llm)] = chain
     return chain
 
 
-def generate_questions_with_langchain(n, class_name, subject, language, rag_context: Optional[str] = None):
+def build_generation_inputs(n, class_name, subject, language, rag_context: Optional[str] = None,
+                            avoid_questions: Optional[List[str]] = None) -> dict:
     """
-    Generates quiz questions using the LangChain-integrated Gemini model,
-    optionally augmented with RAG context.
+    Builds the input dictionary for the question generator chain.
     """
     subject_str = ", ".join(subject) if isinstance(subject, list) else subject
-    
-    chain = create_question_generator_chain(rag_context=rag_context)
-    
-    response_text = chain.invoke({
+
+    rag_block = f"\nUse this context: {rag_context}\n" if rag_context else ""
+    avoid_block = ""
+    if avoid_questions:
+        listed = "\n".join(f"- {q}" for q in avoid_questions)
+        avoid_block = f"\nDo not repeat any of these questions:\n{listed}\n"
+
+    return {
         "n": n,
         "class_name": class_name,
         "subject_str": subject_str,
-        "language": language
-    })
-    return response_text
+        "language": language,
+        "rag_block": rag_block,
+        "avoid_block": avoid_block
+    }
+
+
+async def agenerate_questions_with_langchain(n, class_name, subject, language, rag_context: Optional[str] = None,
+                                             avoid_questions: Optional[List[str]] = None) -> str:
+    """
+    Generates quiz questions using the LangChain-integrated Gemini model,
+    optionally augmented with RAG context.
+    avoid_questions lists questions already accepted, so a top-up request does not repeat them.
+    """
+    chain = create_question_generator_chain(rag_context=rag_context)
+    return await chain.ainvoke(
+        build_generation_inputs(n, class_name, subject, language, rag_context, avoid_questions)
+    )
+
+
+async def astream_questions_with_langchain(n, class_name, subject, language, rag_context: Optional[str] = None,
+                                           avoid_questions: Optional[List[str]] = None) -> AsyncIterator[str]:
+    """
+    Same as agenerate_questions_with_langchain, but yields the raw text chunks
+    as the LLM produces them (feed them to QuizStreamParser).
+    """
+    chain = create_question_generator_chain(rag_context=rag_context)
+    async for chunk in chain.astream(
+        build_generation_inputs(n, class_name, subject, language, rag_context, avoid_questions)
+    ):
+        yield chunk
+
+
+def generate_questions_with_langchain(n, class_name, subject, language, rag_context: Optional[str] = None,
+                                      avoid_questions: Optional[List[str]] = None) -> str:
+    """
+    Sync wrapper around agenerate_questions_with_langchain.
+    """
+    return run_sync(agenerate_questions_with_langchain(n, class_name, subject, language, rag_context, avoid_questions))
+
+
+def stream_questions_with_langchain(n, class_name, subject, language, rag_context: Optional[str] = None,
+                                    avoid_questions: Optional[List[str]] = None) -> Iterator[str]:
+    """
+    Sync wrapper around astream_questions_with_langchain.
+    """
+    return iterate_sync(astream_questions_with_langchain(n, class_name, subject, language, rag_context, avoid_questions))
+
+# --- SINGLE-PASS QUIZ PARSER ---
+# The LLM output is consumed line by line with anchored patterns, so parsing is linear
+# in the input size no matter how malformed the text is (no cross-line backtracking).
+
+_LINE_PREFIX = r"^[\s*#>-]*"
+QUESTION_LINE_RE = re.compile(_LINE_PREFIX + r"(\d+)\s*[.)]\s*\**\s*Question\s*:\**\s*(.*)$")
+OPTION_LINE_RE = re.compile(_LINE_PREFIX + r"([ABCD])\s*[.)]\s*(.*)$")
+ANSWER_LINE_RE = re.compile(_LINE_PREFIX + r"Answer\s*:\s*\**\s*([ABCD])\b")
+TAG_LINE_RE = re.compile(_LINE_PREFIX + r"(Subject|Topic)\s*:\**\s*(.*?)\**\s*$")
+
+OPTION_KEYS = ("A", "B", "C", "D")
+
+
+class QuizStreamParser:
+    """
+    Incremental parser for the quiz format requested in QUIZ_TEMPLATE.
+
+    Call feed() with text chunks as they arrive (e.g. from an LLM token stream); it
+    returns the questions completed by that chunk. Call close() once the text ends.
+    Questions that end without a complete set of options/answer are reported in
+    `errors` instead of being returned.
+    """
+
+    def __init__(self):
+        self.errors: List[str] = []
+        self._pending: List[str] = []   # pieces of the current, not yet terminated line
+        self._current: Optional[dict] = None
+        self._field: Optional[str] = None   # "question" or an option key receiving continuation lines
+
+    def feed(self, chunk: str) -> List[dict]:
+        completed = []
+        if "\n" not in chunk:
+            self._pending.append(chunk)
+            return completed
+
+        lines = chunk.split("\n")
+        self._pending.append(lines[0])
+        first_line = "".join(self._pending)
+        self._pending = [lines[-1]]
+
+        self._consume_line(first_line, completed)
+        for line in lines[1:-1]:
+            self._consume_line(line, completed)
+        return completed
+
+    def close(self) -> List[dict]:
+        completed = []
+        self._consume_line("".join(self._pending), completed)
+        self._pending = []
+        if self._current is not None:
+            self._reject("no answer line")
+        return completed
+
+    def _consume_line(self, line: str, completed: List[dict]) -> None:
+        line = line.rstrip("\r")
+
+        match = QUESTION_LINE_RE.match(line)
+        if match:
+            if self._current is not None:
+                self._reject("no answer line before the next question")
+            self._current = {"number": match.group(1), "question": [match.group(2)], "options": {}, "tags": {}}
+            self._field = "question"
+            return
+
+        if self._current is None:
+            return  # preamble or commentary outside a question
+
+        match = ANSWER_LINE_RE.match(line)
+        if match:
+            self._finish(match.group(1), completed)
+            return
+
+        match = TAG_LINE_RE.match(line)
+        if match:
+            self._current["tags"][match.group(1).lower()] = match.group(2).strip()
+            return
+
+        match = OPTION_LINE_RE.match(line)
+        if match and match.group(1) not in self._current["options"]:
+            self._current["options"][match.group(1)] = [match.group(2)]
+            self._field = match.group(1)
+            return
+
+        # Continuation of the question text or of the last option
+        if self._field == "question":
+            self._current["question"].append(line)
+        else:
+            self._current["options"][self._field].append(line)
+
+    def _finish(self, answer: str, completed: List[dict]) -> None:
+        current = self._current
+        question = "\n".join(current["question"]).strip()
+        options = {key: "\n".join(current["options"].get(key, [])).strip() for key in OPTION_KEYS}
+        missing = [key for key in OPTION_KEYS if not options[key]]
+
+        if not question:
+            self._reject("empty question text")
+        elif missing:
+            self._reject(f"missing option(s) {', '.join(missing)}")
+        else:
+            parsed = {"question": question, "options": options, "correct": answer}
+            # Optional "Subject:" / "Topic:" tags produced at generation time
+            for tag, value in current["tags"].items():
+                if value:
+                    parsed[tag] = value
+            completed.append(parsed)
+            self._current = None
+            self._field = None
+
+    def _reject(self, reason: str) -> None:
+        error = f"Question {self._current['number']}: {reason}"
+        print(f"Parsing Error: {error}")
+        self.errors.append(error)
+        self._current = None
+        self._field = None
+
+
+
+def parse_quiz_text(raw_text: str) -> Tuple[List[dict], List[str]]:
+    """
+    Parses a complete quiz text in a single pass.
+    Returns (questions, errors), where errors describes every rejected question.
+    """
+    parser = QuizStreamParser()
+    questions = parser.feed(raw_text or "")
+    questions.extend(parser.close())
+    return questions, parser.errors
+
 
 def evaluate_quiz_format(raw_text: str) -> bool:
     """
-    Evaluates if the raw generated quiz text adheres to the expected format.
-    Checks for:
-    - Presence of "Question:"
-    - Presence of A, B, C, D options
-    - Presence of "Answer: X"
+    Evaluates if the raw generated quiz text adheres to the expected format,
+    i.e. contains at least one complete question with:
+    - "N. Question:"
+    - A, B, C, D options
+    - "Answer: X"
     """
-    if not re.search(r"\d+\.\s*Question:", raw_text):
-        print("Evaluation Failed: No question marker found.")
-        return False
-    
-    pattern = r"Question:.*?A\..*?B\..*?C\..*?D\..*?Answer:\s*[ABCD]"
-    if not re.search(pattern, raw_text, re.DOTALL):
-        print("Evaluation Failed: Incomplete question/options/answer format.")
+    questions, errors = parse_quiz_text(raw_text)
+    if not questions:
+        print(f"Evaluation Failed: No complete question found ({len(errors)} rejected).")
         return False
     
-    print("Evaluation Succeeded: Format appears valid.")
+    print(f"Evaluation Succeeded: {len(questions)} valid question(s), {len(errors)} rejected.")
     return True
 
 def parse_questions(raw_text):
     """
     Parses the raw text output from the LLM into a structured list of questions.
-    Each question includes the question text, options, and the correct answer.
+    Each question includes the question text, options, and the correct answer,
+    plus "subject" and "topic" when the LLM tagged the question.
     """
-    questions = []
-    pattern = r"\d+\.\s*Question:(.*?)\s*A\.(.*?)\s*B\.(.*?)\s*C\.(.*?)\s*D\.(.*?)\s*Answer:\s*([ABCD])"
-    matches = re.findall(pattern, raw_text, re.DOTALL)
-    
-    for match in matches:
-        q = {
-            "question": match[0].strip(),
-            "options": {
-                "A": match[1].strip(),
-                "B": match[2].strip(),
-                "C": match[3].strip(),
-                "D": match[4].strip(),
-            },
-            "correct": match[5].strip()
-        }
-        questions.append(q)
+    questions, _ = parse_quiz_text(raw_text)
     return questions
@@ -1,16 +1,21 @@
 # backend/quiz_evaluation_graph.py
 
-from typing import TypedDict, List, Any
+import uuid
+import asyncio
+import inspect
+from typing import TypedDict, List, Any, Optional
 from langgraph.graph import StateGraph, END
 
 # Import existing backend logic
 from backend.performance_evaluator import (
     evaluate_answers,
-    generate_performance_report,
-    generate_personalized_feedback,
-    extract_or_generate_subject_topic
+    agenerate_performance_report,
+    agenerate_personalized_feedback,
+    aclassify_subject_topics_batch
 )
-from backend.student_data import DataStore
+from backend.student_data import DataStore, AsyncDataStore
+from backend.graph_registry import get_compiled_graph
+from backend.async_utils import run_sync
 
 
 # -------------------- STATE FOR EVALUATION GRAPH --------------------
@@ -22,24 +27,44 @@ class EvaluationState(TypedDict):
     evaluation_results: List[dict] # Detailed grading results per question
     performance_report: str        # LLM-generated performance report
     feedback: str                   # LLM-generated personalized feedback
-    data_store: Any                 # DataStore instance
+    data_store: Any                 # DataStore or AsyncDataStore instance
     class_selected: str             # Class name
     selected_subject: str           # Subject name OR list
     general_topics: List[str]       # For topic classification if general class
     auto_detect : bool              # checking if auto detect selected or not
+    llm_report: bool                # Ask the LLM for a narrative report instead of the local template
+    submit_id: str                  # ID of this submission; the stored attempt's _id
 
 
 # ======================= NODES =======================
 
-def add_subject_topic_node(state: EvaluationState) -> EvaluationState:
+async def add_subject_topic_node(state: EvaluationState) -> EvaluationState:
     """
     Enrich each question with subject & topic.
     - Auto-detect mode: we already have subject/topic pairs, assign directly (no LLM).
-    - Other modes: detect using LLM.
+    - Other modes: use the Subject/Topic tags produced at generation time; only untagged
+      questions are classified, with one batched LLM call (per-question calls only as fallback).
     """
     print("--- Evaluation Graph: Adding subject/topic to questions ---")
     enriched_questions = []
 
+    def is_tagged(q):
+        return bool(q.get("subject")) and bool(q.get("topic"))
+
+    # Manual or general mode → classify only the questions generated without tags
+    tags = {}
+    if not state.get("auto_detect", False):
+        untagged = [i for i, q in enumerate(state["questions"]) if not is_tagged(q)]
+        print(f"--- Evaluation Graph: {len(state['questions']) - len(untagged)} question(s) tagged at generation time ---")
+        if untagged:
+            classified = await aclassify_subject_topics_batch(
+                [state["questions"][i] for i in untagged],
+                state["class_selected"],
+                state["selected_subject"],
+                state["general_topics"]
+            )
+            tags = dict(zip(untagged, classified))
+
     for i, q in enumerate(state["questions"]):
 
         # Auto-detect mode: selected_subject is a list of "Subject - Topic" strings
@@ -49,20 +74,18 @@ def add_subject_topic_node(state: EvaluationState) -> EvaluationState:
                 q["subject"] = subj.strip()
                 q["topic"] = topic.strip()
             except Exception:
-                # Fallback in case of mismatch
-                q["subject"] = "Unknown"
-                q["topic"] = "Unknown"
+                # Fallback in case of mismatch: keep the generation-time tags if any
+                if not is_tagged(q):
+                    q["subject"] = "Unknown"
+                    q["topic"] = "Unknown"
 
         else:
-            # Manual or general mode → use LLM extraction
-            subj, topic = extract_or_generate_subject_topic(
-                q["question"],
-                state["class_selected"],
-                state["selected_subject"],
-                state["general_topics"]
-            )
-            q["subject"] = subj
-            q["topic"] = topic
+            if i in tags:
+                q["subject"], q["topic"] = tags[i]
+            # In specific-subject mode keep the selected subject name, so stored
+            # aggregates do not split across spellings ("Math" vs "Mathematics")
+            if isinstance(state["selected_subject"], str) and not state["general_topics"]:
+                q["subject"] = state["selected_subject"]
 
         enriched_questions.append(q)
 
@@ -81,36 +104,45 @@ def evaluate_answers_node(state: EvaluationState) -> EvaluationState:
     return state
 
 
-def generate_report_node(state: EvaluationState) -> EvaluationState:
+# The three nodes below run in parallel (fan-out after evaluate_answers), so each one
+# returns only the keys it writes instead of the whole state.
+
+async def generate_report_node(state: EvaluationState) -> dict:
     """
-    Generates a performance report using LLM.
+    Generates the performance report (local template, or LLM when llm_report is set
+    or the language has no template labels).
     """
     print("--- Evaluation Graph: Generating performance report ---")
-    report = generate_performance_report(state["evaluation_results"], language=state["language"])
-    state["performance_report"] = report
-    return state
+    report = await agenerate_performance_report(state["evaluation_results"], language=state["language"],
+                                         use_llm=state.get("llm_report", False))
+    return {"performance_report": report}
 
 
-def generate_feedback_node(state: EvaluationState) -> EvaluationState:
+async def generate_feedback_node(state: EvaluationState) -> dict:
     """
     Generates personalized feedback using LLM.
     """
     print("--- Evaluation Graph: Generating personalized feedback ---")
-    feedback = generate_personalized_feedback(state["evaluation_results"], language=state["language"])
-    state["feedback"] = feedback
-    return state
+    feedback = await agenerate_personalized_feedback(state["evaluation_results"], language=state["language"])
+    return {"feedback": feedback}
 
 
-def update_db_node(state: EvaluationState) -> EvaluationState:
+async def update_db_node(state: EvaluationState) -> dict:
     """
     Updates the student's performance record in MongoDB.
+    Works with both DataStore (run in a worker thread) and AsyncDataStore.
     """
     print("--- Evaluation Graph: Updating database with results ---")
-    datastore: DataStore = state["data_store"]
-    datastore.update_student_performance( student_id= state["student_id"],
-                                        class_name=state["class_selected"], 
-                                        evaluation_results=state["evaluation_results"])
-    return state
+    datastore = state["data_store"]
+    kwargs = dict(student_id= state["student_id"],
+                  class_name=state["class_selected"], 
+                  evaluation_results=state["evaluation_results"],
+                  submit_id=state.get("submit_id"))
+    if inspect.iscoroutinefunction(datastore.update_student_performance):
+        await datastore.update_student_performance(**kwargs)
+    else:
+        await asyncio.to_thread(datastore.update_student_performance, **kwargs)
+    return {}
 
 
 # ======================= BUILD GRAPH =======================
@@ -118,6 +150,12 @@ def update_db_node(state: EvaluationState) -> EvaluationState:
 def build_quiz_evaluation_graph():
     """
     Builds and compiles the LangGraph workflow for quiz evaluation.
+
+    add_subject_topic -> evaluate_answers -> ┬ generate_report   ┬ -> END
+                                             ├ generate_feedback ┤
+                                             └ update_db         ┘
+    Report, feedback and the database write only depend on evaluation_results,
+    so they run in the same step and submit latency is the slowest of the three.
     """
     workflow = StateGraph(EvaluationState)
 
@@ -131,31 +169,38 @@ def build_quiz_evaluation_graph():
     # Set execution flow
     workflow.set_entry_point("add_subject_topic")
     workflow.add_edge("add_subject_topic", "evaluate_answers")
-    workflow.add_edge("evaluate_answers", "generate_report")
-    workflow.add_edge("generate_report", "generate_feedback")
-    workflow.add_edge("generate_feedback", "update_db")
-    workflow.add_edge("update_db", END)
+
+    # Fan-out: all three branches start once grading is done and run in the same
+    # step; the run ends when every branch has finished.
+    for branch in ("generate_report", "generate_feedback", "update_db"):
+        workflow.add_edge("evaluate_answers", branch)
+        workflow.add_edge(branch, END)
 
     return workflow.compile()
 
 
 # ======================= RUN GRAPH FUNCTION =======================
 
-def run_quiz_evaluation_agent(
+async def arun_quiz_evaluation_agent(
         student_id: str,
         questions: List[dict],
         answers: List[str],
         language: str,
-        data_store: DataStore,
+        data_store: DataStore | AsyncDataStore,
         class_selected: str,
         selected_subject: str,
         general_topics: List[str],
-        auto_detect: bool = False
+        auto_detect: bool = False,
+        llm_report: bool = False,
+        submit_id: Optional[str] = None
 ) -> EvaluationState:
     """
     Runs the evaluation workflow and returns the final state.
+    The performance report is built locally unless llm_report=True.
+    Running it again with the same submit_id does not record the attempt twice
+    (a new ID is generated when none is given).
     """
-    app = build_quiz_evaluation_graph()
+    app = get_compiled_graph("quiz_evaluation", build_quiz_evaluation_graph)
     initial_state: EvaluationState = {
         "student_id": student_id,
         "questions": questions,
@@ -169,6 +214,29 @@ def run_quiz_evaluation_agent(
         "selected_subject": selected_subject,
         "general_topics": general_topics,
         "auto_detect": auto_detect,
+        "llm_report": llm_report,
+        "submit_id": submit_id or uuid.uuid4().hex,
     }
-    final_state = app.invoke(initial_state)
+    final_state = await app.ainvoke(initial_state)
     return final_state
+
+
+def run_quiz_evaluation_agent(
+        student_id: str,
+        questions: List[dict],
+        answers: List[str],
+        language: str,
+        data_store: DataStore | AsyncDataStore,
+        class_selected: str,
+        selected_subject: str,
+        general_topics: List[str],
+        auto_detect: bool = False,
+        llm_report: bool = False,
+        submit_id: Optional[str] = None
+) -> EvaluationState:
+    """
+    Synchronous wrapper around arun_quiz_evaluation_agent.
+    """
+    return run_sync(arun_quiz_evaluation_agent(student_id, questions, answers, language, data_store,
+                                               class_selected, selected_subject, general_topics,
+                                               auto_detect, llm_report, submit_id))
@@ -0,0 +1,397 @@
+# backend/rag_ingest.py
+# Bulk ingestion of a directory of .txt/.md curriculum files into the persistent RAG index.
+#
+# Files are read one at a time and chunked in a generator pipeline; chunks are embedded in
+# fixed-size batches by a small pool of workers (with backoff on rate limits) and appended
+# to the index as results arrive, so only a bounded number of chunks is in flight at once.
+# Progress is checkpointed as delta shards in a journal next to the index: an interrupted
+# run replays them and resumes where it stopped; the index is published once at the end.
+#
+# Files laid out as <source_dir>/<class>/<subject>/<topic>.md (e.g. "Class 6-8/Science/Light.md")
+# are tagged with that class/subject/topic for filtered retrieval; other files apply to all.
+#
+# Usage:
+#     python -m backend.rag_ingest <source_dir> [--batch-size 64] [--concurrency 4] [--checkpoint-every 50]
+#                                  [--index-spec "IVF4096,PQ64"]
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_community.vectorstores import FAISS
+
+from backend.rag_vector_store import (
+    RAG_INDEX_DIR,
+    RAG_INDEX_SPEC,
+    ingestion_lock,
+    document_hash,
+    get_embeddings,
+    load_rag_db,
+    parse_class_range,
+    prune_rag_versions,
+    rag_registry_version,
+    read_manifest,
+    rebuild_rag_index,
+    rebuild_vector_store,
+    save_rag_db,
+    split_document,
+    supports_removal,
+)
+
+
+SOURCE_EXTENSIONS = (".txt", ".md")
+
+# Checkpoint journal of an unfinished run, inside the index directory
+INGEST_JOURNAL_DIR = ".ingest-journal"
+
+# (doc_id, doc_hash, chunk_id, chunk_text, chunk_metadata, is_last_chunk_of_document)
+Chunk = Tuple[str, str, str, str, dict, bool]
+
+
+
+# ======================= PIPELINE STAGES =======================
+
+def iter_source_files(source_dir: str) -> Iterator[str]:
+    """
+    Yields the .txt/.md files under source_dir, in a stable order.
+    """
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(SOURCE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def metadata_from_path(doc_id: str) -> dict:
+    """
+    "Class 6-8/Science/Light.md" -> {"source": ..., "class": "Class 6-8", "subject": "Science", "topic": "Light"}
+    """
+    metadata = {"source": doc_id}
+    parts = doc_id.split("/")
+    if len(parts) >= 3 and parse_class_range(parts[0]):
+        metadata["class"] = parts[0]
+        metadata["subject"] = parts[1]
+        metadata["topic"] = os.path.splitext(parts[-1])[0]
+    return metadata
+
+
+def iter_chunks(source_dir: str, registry: dict, stats: dict) -> Iterator[Chunk]:
+    """
+    Reads the files lazily (one in memory at a time) and yields the chunks of every file
+    that is new or changed since it was last ingested. The document ID is the file path
+    relative to source_dir.
+    """
+    for path in iter_source_files(source_dir):
+        doc_id = os.path.relpath(path, source_dir).replace(os.sep, "/")
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        metadata = metadata_from_path(doc_id)
+
+        doc_hash = document_hash(text, metadata)
+        previous = registry.get(doc_id)
+        if previous and previous["hash"] == doc_hash:
+            stats["skipped"] += 1
+            continue
+
+        texts, metadatas, ids = split_document(doc_id, text, metadata)
+        for i, (chunk_text, chunk_metadata, chunk_id) in enumerate(zip(texts, metadatas, ids)):
+            yield doc_id, doc_hash, chunk_id, chunk_text, chunk_metadata, i == len(texts) - 1
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+
+# ======================= EMBEDDING =======================
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    message = f"{type(error).__name__} {error}".lower()
+    return any(marker in message for marker in ("429", "resourceexhausted", "resource exhausted", "rate limit", "quota"))
+
+
+def embed_with_backoff(embeddings, texts: List[str], max_retries: int = 6, base_delay: float = 1.0) -> List[List[float]]:
+    """
+    Embeds one batch, retrying rate-limit errors with exponential backoff and jitter.
+    Other errors are raised immediately.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt == max_retries or not _is_rate_limit_error(e):
+                raise
+            delay = base_delay * (2 ** attempt) + random.uniform(0, base_delay)
+            print(f"⏳ Embedding rate limited, retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+
+def iter_embedded_batches(chunks: Iterable[Chunk], embeddings, batch_size: int, concurrency: int
+                          ) -> Iterator[Tuple[List[Chunk], List[List[float]]]]:
+    """
+    Embeds chunk batches on `concurrency` worker threads and yields (batch, vectors) in
+    input order. At most `concurrency` batches are in flight, which bounds memory.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = deque()
+        for batch in batched(chunks, batch_size):
+            in_flight.append((batch, executor.submit(embed_with_backoff, embeddings, [c[3] for c in batch])))
+            if len(in_flight) >= concurrency:
+                done_batch, future = in_flight.popleft()
+                yield done_batch, future.result()
+        while in_flight:
+            done_batch, future = in_flight.popleft()
+            yield done_batch, future.result()
+
+
+
+# ======================= CHECKPOINT JOURNAL =======================
+
+def _empty_change() -> dict:
+    # What one batch (or everything since the last checkpoint) changed
+    return {"completed": {}, "dropped": [], "removed": [], "texts": [], "metadatas": [], "ids": [], "vectors": []}
+
+
+def _merge_change(target: dict, change: dict) -> None:
+    target["completed"].update(change["completed"])
+    for key in ("dropped", "removed", "texts", "metadatas", "ids", "vectors"):
+        target[key].extend(change[key])
+
+
+class IngestJournal:
+    """
+    Delta checkpoints of an ingestion run in <index_dir>/.ingest-journal: one shard per
+    checkpoint with only what changed since the previous one (completed and dropped
+    documents, removed chunk IDs, new chunks and their vectors), so checkpoint I/O is
+    proportional to the new data. Shards apply on top of the CURRENT version the run
+    started from; a journal written against another version is discarded.
+    """
+
+    def __init__(self, index_dir: str, base_version: Optional[str]):
+        self.path = os.path.join(index_dir, INGEST_JOURNAL_DIR)
+        header_path = os.path.join(self.path, "journal.json")
+        if os.path.isdir(self.path):
+            try:
+                with open(header_path, encoding="utf-8") as f:
+                    valid = json.load(f)["base_version"] == base_version
+            except (OSError, ValueError, KeyError):
+                valid = False
+            if not valid:
+                print("--- Discarding an ingestion journal of another index version ---")
+                shutil.rmtree(self.path)
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+            self._write_json(header_path, {"base_version": base_version})
+
+    @staticmethod
+    def _write_json(path: str, data) -> None:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def _shard_numbers(self) -> List[int]:
+        # A shard counts once its .json exists (it is written after the vectors)
+        return sorted(int(name[6:-5]) for name in os.listdir(self.path)
+                      if name.startswith("shard-") and name.endswith(".json"))
+
+    def replay(self) -> Iterator[dict]:
+        for number in self._shard_numbers():
+            base = os.path.join(self.path, f"shard-{number:06d}")
+            with open(base + ".json", encoding="utf-8") as f:
+                change = json.load(f)
+            change["vectors"] = np.load(base + ".npy")
+            yield change
+
+    def append(self, change: dict) -> int:
+        numbers = self._shard_numbers()
+        number = numbers[-1] + 1 if numbers else 1
+        base = os.path.join(self.path, f"shard-{number:06d}")
+        vectors = np.asarray(change["vectors"], dtype="float32")
+        with open(base + ".npy.tmp", "wb") as f:
+            np.save(f, vectors)
+        os.replace(base + ".npy.tmp", base + ".npy")
+        self._write_json(base + ".json", {key: value for key, value in change.items() if key != "vectors"})
+        return number
+
+    def discard(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+
+# ======================= INGESTION =======================
+
+def ingest_directory(source_dir: str, api_key: str, index_dir: str = RAG_INDEX_DIR, batch_size: int = 64,
+                     concurrency: int = 4, checkpoint_every: int = 50, index_spec: str = RAG_INDEX_SPEC) -> Optional[str]:
+    """
+    Ingests every new or changed file under source_dir into the saved RAG index.
+
+    Documents already in the index with the same content are skipped. Every
+    `checkpoint_every` completed files the changes since the previous checkpoint are
+    appended to the IngestJournal, so a crashed or interrupted run replays them and
+    resumes from the last checkpoint (chunks embedded after it are served from the
+    embedding cache). The index is published as a new version once, at the end.
+    Returns the final CURRENT version.
+
+    Memory: embedding keeps only batch_size x concurrency chunks in flight, but the index
+    being extended (and its docstore) is held in memory for the whole run, so peak memory
+    grows with the size of the resulting index.
+
+    A new index is filled as Flat and rebuilt as index_spec at the end (its first batches
+    are too small to train IVF/PQ). Likewise an existing index that cannot remove replaced
+    chunks in place (anything but Flat, see supports_removal) is ingested into as a Flat
+    copy and rebuilt as its own type afterwards.
+    """
+    with ingestion_lock(index_dir):
+        manifest = read_manifest(index_dir) or {}
+        vector_store = load_rag_db(api_key, index_dir, mmap=False) if manifest.get("documents") else None
+        registry = dict(manifest["documents"]) if vector_store is not None else {}
+
+        target_spec = manifest.get("index_spec", "Flat") if vector_store is not None else index_spec
+        working_spec = target_spec if vector_store is not None else "Flat"
+        embeddings = get_embeddings(api_key)
+        changed = False
+
+        def removable_store():
+            # Switches to a Flat copy the first time chunks must go from an index that cannot remove them
+            nonlocal vector_store, working_spec
+            if not supports_removal(vector_store.index):
+                print(f"--- {working_spec} index cannot remove vectors, ingesting into a Flat copy ---")
+                vector_store = rebuild_vector_store(vector_store, "Flat")
+                working_spec = "Flat"
+            return vector_store
+
+        def apply(change: dict) -> None:
+            nonlocal vector_store, changed
+            changed = True
+            for doc_id in change["dropped"]:
+                registry.pop(doc_id, None)
+            if change["removed"]:
+                removable_store().delete(change["removed"])
+            if change["ids"]:
+                text_embeddings = list(zip(change["texts"], change["vectors"]))
+                if vector_store is None:
+                    vector_store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=change["metadatas"],
+                                                         ids=change["ids"])
+                else:
+                    vector_store.add_embeddings(text_embeddings, metadatas=change["metadatas"], ids=change["ids"])
+            registry.update(change["completed"])
+
+        journal = IngestJournal(index_dir, manifest.get("version") if vector_store is not None else None)
+        replayed = 0
+        for change in journal.replay():
+            apply(change)
+            replayed += 1
+        if replayed:
+            print(f"--- Resuming from {replayed} checkpoint(s): {len(registry)} files in the index ---")
+
+        delta = _empty_change()
+        if vector_store is not None:
+            # Chunks of a document that was still being ingested at the last checkpoint
+            registered = {chunk_id for entry in registry.values() for chunk_id in entry["chunks"]}
+            orphans = [i for i in vector_store.index_to_docstore_id.values() if i not in registered]
+            if orphans:
+                change = {**_empty_change(), "removed": orphans}
+                apply(change)
+                _merge_change(delta, change)
+
+        stats = {"skipped": 0, "ingested": 0, "chunks": 0}
+        doc_chunks = {}
+        completed_since_checkpoint = 0
+        started = time.perf_counter()
+
+        chunks = iter_chunks(source_dir, registry, stats)
+        for batch, vectors in iter_embedded_batches(chunks, embeddings, batch_size, concurrency):
+            change = _empty_change()
+            for doc_id, *_ in batch:
+                # A changed document replaces its previous chunks
+                if doc_id not in doc_chunks and doc_id in registry:
+                    change["dropped"].append(doc_id)
+                    change["removed"].extend(registry[doc_id]["chunks"])
+                doc_chunks.setdefault(doc_id, [])
+            for doc_id, doc_hash, chunk_id, chunk_text, chunk_metadata, is_last in batch:
+                change["texts"].append(chunk_text)
+                change["metadatas"].append(chunk_metadata)
+                change["ids"].append(chunk_id)
+                doc_chunks[doc_id].append(chunk_id)
+                if is_last:
+                    change["completed"][doc_id] = {"hash": doc_hash, "chunks": doc_chunks.pop(doc_id)}
+                    stats["ingested"] += 1
+                    completed_since_checkpoint += 1
+            change["vectors"] = list(np.asarray(vectors, dtype="float32"))
+            apply(change)
+            _merge_change(delta, change)
+            stats["chunks"] += len(batch)
+
+            if completed_since_checkpoint >= checkpoint_every:
+                number = journal.append(delta)
+                delta = _empty_change()
+                completed_since_checkpoint = 0
+                print(f"💾 Checkpoint {number}: {stats['ingested']} files, {stats['chunks']} chunks "
+                      f"({time.perf_counter() - started:.0f}s)")
+
+        if vector_store is None:
+            journal.discard()
+            print("Nothing to ingest.")
+            return None
+        if changed:
+            version = rag_registry_version(registry, working_spec)
+            save_rag_db(vector_store, version, index_dir, extra_manifest={"documents": registry, "index_spec": working_spec})
+            prune_rag_versions(index_dir)
+        else:
+            version = vector_store.index_version
+        journal.discard()
+        print(f"✅ Ingested {stats['ingested']} files ({stats['chunks']} chunks), skipped {stats['skipped']} unchanged; "
+              f"index {version}, embedding cache {embeddings.stats()}")
+
+    # rebuild_rag_index takes the ingestion lock itself
+    if working_spec != target_spec:
+        try:
+            version = rebuild_rag_index(api_key, target_spec, index_dir)
+        except ValueError as e:
+            print(f"⚠️ {e} Keeping the Flat index; run rebuild_rag_index once the corpus has grown.")
+    return version
+
+
+
+def main(argv: Optional[List[str]] = None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Ingest a directory of .txt/.md files into the RAG index.")
+    parser.add_argument("source_dir")
+    parser.add_argument("--index-dir", default=RAG_INDEX_DIR)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--checkpoint-every", type=int, default=50)
+    parser.add_argument("--index-spec", help='rebuild the index as this FAISS index type afterwards, e.g. "IVF4096,Flat"')
+    args = parser.parse_args(argv)
+
+    ingest_directory(
+        args.source_dir,
+        os.getenv("GOOGLE_API_KEY"),
+        index_dir=args.index_dir,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint_every=args.checkpoint_every,
+        index_spec=args.index_spec or RAG_INDEX_SPEC,
+    )
+    if args.index_spec and (read_manifest(args.index_dir) or {}).get("index_spec", "Flat") != args.index_spec:
+        rebuild_rag_index(os.getenv("GOOGLE_API_KEY"), args.index_spec, args.index_dir)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
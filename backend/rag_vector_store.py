@@ -1,57 +1,811 @@
 # backend/rag_engine.py
 
 import os
-from typing import Optional
+import re
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Tuple
 
+import faiss
+import numpy as np
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+from backend.embedding_cache import CachedEmbeddings
+from backend.cache import TTLCache
 
 
-def initialize_rag_db(text_content: str, api_key: str) -> FAISS:
+
+# Sample RAG Content (for demonstration)
+# In a real app, this would come from files, a database, etc. (see backend/rag_ingest.py)
+# "class" may be a single class ("Class 7") or a range ("Class 6-8"); documents without
+# class/subject metadata are retrieved for every class/subject.
+RAG_SAMPLE_DOCUMENTS = [
+    {
+        "id": "rag_sample/class-1-5-math",
+        "text": "Class 1-5 Basic Math: Addition is the process of combining two or more numbers to get a total. Subtraction is taking one number away from another. Multiplication is repeated addition, and division is splitting into equal parts. Fractions represent parts of a whole.",
+        "metadata": {"class": "Class 1-5", "subject": "Math", "topic": "Arithmetic"},
+    },
+    {
+        "id": "rag_sample/class-6-8-science",
+        "text": "Class 6-8 Science: Photosynthesis is the process by which plants make their food using sunlight, water, and carbon dioxide. The human circulatory system includes the heart and blood vessels that transport oxygen and nutrients.",
+        "metadata": {"class": "Class 6-8", "subject": "Science", "topic": "Biology"},
+    },
+    {
+        "id": "rag_sample/class-9-12-physics",
+        "text": "Class 9-12 Physics: Newton's Laws of Motion describe how forces affect an object's movement. The first law states an object at rest stays at rest unless acted upon by a force.",
+        "metadata": {"class": "Class 9-12", "subject": "Physics", "topic": "Laws of Motion"},
+    },
+    {
+        "id": "rag_sample/bachelors",
+        "text": "Bachelors: Advanced mathematics includes subjects like linear algebra, calculus, and differential equations. Computer science covers algorithms, data structures, programming paradigms, and software development principles.",
+        "metadata": {"class": "Bachelors", "subject": ["Math", "Computer Science"]},
+    },
+    {
+        "id": "rag_sample/masters",
+        "text": "Masters: Topics include advanced algorithms, machine learning, artificial intelligence, distributed computing, and data science.",
+        "metadata": {"class": "Masters", "subject": "Computer Science"},
+    },
+]
+RAG_SAMPLE_TEXT = "\n\n".join(doc["text"] for doc in RAG_SAMPLE_DOCUMENTS)
+
+
+
+EMBEDDING_MODEL = "models/embedding-001"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# On-disk index artifacts: <RAG_INDEX_DIR>/<version>/{index.faiss, docstore.json, manifest.json}
+# and <RAG_INDEX_DIR>/CURRENT naming the active version. Version directories are never
+# modified after they are written, so readers can memory-map them safely.
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "rag_index")
+RAG_INDEX_FORMAT = 2
+# FAISS index_factory spec used when (re)building the index: "Flat" (exact, default),
+# "IVF4096,Flat", "IVF4096,PQ64", "HNSW32", ... plus the matching search-time knobs
+RAG_INDEX_SPEC = os.getenv("RAG_INDEX_SPEC", "Flat")
+RAG_NPROBE = int(os.getenv("RAG_NPROBE", "16"))
+RAG_EF_SEARCH = int(os.getenv("RAG_EF_SEARCH", "64"))
+# ANN indexes are trained on a random sample of at most this many vectors
+RAG_TRAIN_SAMPLE = 100_000
+
+# Upper bound on retrieved context added to the quiz prompt, in (approximate) tokens
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+# Retrieved contexts are cached per (query, k, filters, index version)
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "1024"))
+RAG_CACHE_TTL = float(os.getenv("RAG_CACHE_TTL", "600"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(RAG_INDEX_DIR, "embedding_cache.sqlite"))
+
+
+
+_embeddings_by_key = {}
+
+def get_embeddings(api_key: str) -> CachedEmbeddings:
     """
-    Initializes a FAISS vector store with the provided text content.
-    Splits the text into chunks, creates embeddings, and stores them.
+    Returns the embeddings model used for both indexing and queries, behind the
+    persistent embedding cache: only new/edited chunks and unseen queries reach the API.
     """
     # Ensure API key is available for embeddings
     if not api_key:
         raise ValueError("Google Gemini API Key not provided for RAG embeddings.")
 
+    embeddings = _embeddings_by_key.get(api_key)
+    if embeddings is None:
+        embeddings = CachedEmbeddings(
+            GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=api_key),
+            model=EMBEDDING_MODEL,
+            cache_path=EMBEDDING_CACHE_PATH,
+        )
+        _embeddings_by_key[api_key] = embeddings
+    return embeddings
+
+
+def initialize_rag_db(text_content: str, api_key: str, index_spec: str = RAG_INDEX_SPEC) -> FAISS:
+    """
+    Initializes a FAISS vector store with the provided text content.
+    Splits the text into chunks, creates embeddings, and stores them.
+    index_spec selects the FAISS index type (see build_ann_index).
+    """
     # Initialize embeddings model
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=api_key)
+    embeddings = get_embeddings(api_key)
     
     # Split the text into manageable chunks
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
     chunks = splitter.split_text(text_content)
     
     # Create Document objects
     docs = [Document(page_content=chunk) for chunk in chunks]
     
     # Create a FAISS vector store from the documents and embeddings
-    vector_store = FAISS.from_documents(docs, embeddings)
+    if index_spec == "Flat":
+        return FAISS.from_documents(docs, embeddings)
+
+    vectors = np.array(embeddings.embed_documents(chunks), dtype="float32")
+    return _vector_store_from_index(build_ann_index(vectors, index_spec), docs, embeddings)
+
+
+
+# ======================= ANN INDEXES =======================
+
+def build_ann_index(vectors: np.ndarray, index_spec: str = RAG_INDEX_SPEC,
+                    train_sample: int = RAG_TRAIN_SAMPLE) -> "faiss.Index":
+    """
+    Builds a FAISS index from an index_factory spec ("Flat", "IVF4096,Flat",
+    "IVF4096,PQ64", "HNSW32", ...) and adds the vectors.
+    Indexes that need training (IVF, PQ) are trained on a random sample of the vectors;
+    IVF needs at least ~39 vectors per list (nlist) to train well; a ValueError is raised
+    when there are too few vectors to train at all.
+    """
+    index = faiss.index_factory(vectors.shape[1], index_spec)
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > train_sample:
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), train_sample, replace=False)]
+        try:
+            index.train(sample)
+        except RuntimeError as e:
+            raise ValueError(f"Cannot train a {index_spec} index on {len(sample)} vectors: {e}") from e
+    index.add(vectors)
+    tune_index(index)
+    return index
+
+
+def tune_index(index: "faiss.Index", nprobe: int = RAG_NPROBE, ef_search: int = RAG_EF_SEARCH) -> None:
+    """
+    Applies the search-time speed/recall knobs: nprobe (IVF lists visited per query) and
+    efSearch (HNSW candidate list size). Index types without them are left as they are.
+    """
+    params = faiss.ParameterSpace()
+    if faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe)
+    if hasattr(faiss.downcast_index(index), "hnsw"):
+        params.set_index_parameter(index, "efSearch", ef_search)
+
+
+def _vector_store_from_index(index: "faiss.Index", docs: List[Document], embeddings,
+                             ids: Optional[List[str]] = None) -> FAISS:
+    ids = ids or [str(i) for i in range(len(docs))]
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, docs))),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+
+def build_initial_index(vectors: np.ndarray, index_spec: str = RAG_INDEX_SPEC) -> Tuple["faiss.Index", str]:
+    """
+    build_ann_index for a brand-new index, falling back to Flat when there are too few
+    vectors to train index_spec. Returns (index, spec actually used).
+    """
+    try:
+        return build_ann_index(vectors, index_spec), index_spec
+    except ValueError as e:
+        print(f"⚠️ {e} Using a Flat index; run rebuild_rag_index once the corpus has grown.")
+        return build_ann_index(vectors, "Flat"), "Flat"
+
+
+def supports_removal(index: "faiss.Index") -> bool:
+    """
+    Whether vectors can be removed in place with FAISS.delete. Only Flat indexes can:
+    FAISS.delete renumbers the remaining vectors to positions 0..n-1, which matches a
+    Flat index after remove_ids, but IVF indexes keep their original IDs (and HNSW/PQ
+    cannot remove at all). Every other index type is rebuilt instead (remove_chunks),
+    so index IDs always equal positions in index_to_docstore_id.
+    """
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def index_vectors(vector_store: FAISS) -> np.ndarray:
+    """
+    All vectors of the store in index position order. Read back from the index when it
+    keeps them exactly (Flat, IVF-Flat, HNSW-Flat); compressed (PQ) indexes are
+    re-embedded instead, which the embedding cache serves without API calls.
+    """
+    index = faiss.downcast_index(vector_store.index)
+    if isinstance(index, faiss.IndexIVFFlat):
+        # IVF lists need an ID -> (list, offset) map to reconstruct; dropped again afterwards
+        index.make_direct_map()
+        try:
+            return index.reconstruct_n(0, index.ntotal)
+        finally:
+            index.make_direct_map(False)
+    if isinstance(index, (faiss.IndexFlat, faiss.IndexHNSWFlat)):
+        return index.reconstruct_n(0, index.ntotal)
+
+    ids = [vector_store.index_to_docstore_id[position] for position in range(index.ntotal)]
+    texts = [vector_store.docstore.search(doc_id).page_content for doc_id in ids]
+    return np.array(vector_store.embedding_function.embed_documents(texts), dtype="float32")
+
+
+def rebuild_vector_store(vector_store: FAISS, index_spec: str, drop_ids: Iterable[str] = (),
+                         keep_training: bool = False) -> FAISS:
+    """
+    Copy of the store (without the chunks in drop_ids) in a new index of type index_spec,
+    built from the existing vectors without re-embedding. keep_training reuses the
+    current index's training (IVF centroids, PQ codebooks) instead of training again;
+    index_spec must then be the current type.
+    """
+    drop_ids = set(drop_ids)
+    positions = [p for p in range(vector_store.index.ntotal) if vector_store.index_to_docstore_id[p] not in drop_ids]
+    vectors = index_vectors(vector_store)[positions]
+    ids = [vector_store.index_to_docstore_id[p] for p in positions]
+    docs = [vector_store.docstore.search(doc_id) for doc_id in ids]
+    if keep_training:
+        index = faiss.clone_index(vector_store.index)
+        index.reset()
+        index.add(vectors)
+        tune_index(index)
+    else:
+        index = build_ann_index(vectors, index_spec)
+    return _vector_store_from_index(index, docs, vector_store.embedding_function, ids)
+
+
+def remove_chunks(vector_store: FAISS, chunk_ids: List[str], index_spec: str) -> FAISS:
+    """
+    Removes chunks by docstore ID. Indexes that cannot remove vectors in place (see
+    supports_removal) are rebuilt without them, keeping their training. Returns the
+    resulting store.
+    """
+    if supports_removal(vector_store.index):
+        vector_store.delete(chunk_ids)
+        return vector_store
+    print(f"--- Rebuilding the {index_spec} index without {len(chunk_ids)} chunks ---")
+    return rebuild_vector_store(vector_store, index_spec, drop_ids=chunk_ids, keep_training=True)
+
+
+
+# ======================= ON-DISK INDEX =======================
+
+def document_hash(text: str, metadata: Optional[dict] = None) -> str:
+    """
+    Content hash of one source document (text + metadata).
+    """
+    payload = json.dumps({"text": text, "metadata": metadata or {}}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def rag_registry_version(registry: dict, index_spec: str = "Flat") -> str:
+    """
+    Version key of an index holding the documents in registry ({doc_id: {"hash": ...}}):
+    changes whenever a document, the embedding model, the chunking settings, the index
+    type or the artifact format change.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{RAG_INDEX_FORMAT}|{EMBEDDING_MODEL}|{CHUNK_SIZE}|{CHUNK_OVERLAP}|{index_spec}|".encode("utf-8"))
+    for doc_id in sorted(registry):
+        digest.update(f"{doc_id}:{registry[doc_id]['hash']}|".encode("utf-8"))
+    return f"v{RAG_INDEX_FORMAT}-{digest.hexdigest()[:16]}"
+
+
+def read_current_version(index_dir: str = RAG_INDEX_DIR) -> Optional[str]:
+    """
+    Returns the active index version recorded in <index_dir>/CURRENT, if any.
+    """
+    try:
+        with open(os.path.join(index_dir, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(index_dir: str = RAG_INDEX_DIR, version: Optional[str] = None) -> Optional[dict]:
+    """
+    Returns the manifest of the given (default: CURRENT) index version, if any.
+    """
+    version = version or read_current_version(index_dir)
+    if not version:
+        return None
+    try:
+        with open(os.path.join(index_dir, version, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_current_version(index_dir: str, version: str) -> None:
+    # Write-then-rename, so readers never see a half-written pointer
+    tmp_path = os.path.join(index_dir, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(index_dir, "CURRENT"))
+
+
+def save_rag_db(vector_store: FAISS, version: str, index_dir: str = RAG_INDEX_DIR, extra_manifest: Optional[dict] = None) -> str:
+    """
+    Writes the FAISS index and its docstore to <index_dir>/<version> and marks it as CURRENT.
+    The artifact is assembled in a temporary directory and renamed into place atomically.
+    Returns the version directory.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    final_dir = os.path.join(index_dir, version)
+
+    if not os.path.isdir(final_dir):
+        tmp_dir = tempfile.mkdtemp(prefix=f".{version}.", dir=index_dir)
+        faiss.write_index(vector_store.index, os.path.join(tmp_dir, "index.faiss"))
+
+        # Docstore as JSON (in FAISS position order) instead of pickle
+        documents = []
+        for position in range(vector_store.index.ntotal):
+            doc_id = vector_store.index_to_docstore_id[position]
+            doc = vector_store.docstore.search(doc_id)
+            documents.append({"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata})
+        with open(os.path.join(tmp_dir, "docstore.json"), "w", encoding="utf-8") as f:
+            json.dump(documents, f, ensure_ascii=False)
+
+        manifest = {
+            "format": RAG_INDEX_FORMAT,
+            "version": version,
+            "embedding_model": EMBEDDING_MODEL,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "vectors": vector_store.index.ntotal,
+            "created_at": time.time(),
+            **(extra_manifest or {}),
+        }
+        with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        try:
+            os.replace(tmp_dir, final_dir)
+        except OSError:
+            # Another process published the same version first; keep theirs
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    _write_current_version(index_dir, version)
+    vector_store.index_version = version
+    return final_dir
+
+
+def load_rag_db(api_key: str, index_dir: str = RAG_INDEX_DIR, version: Optional[str] = None, mmap: bool = True) -> Optional[FAISS]:
+    """
+    Loads a saved index (the CURRENT one unless version is given), or returns None if absent.
+    With mmap=True the vectors are memory-mapped read-only, so startup does not copy the
+    index into RAM and several worker processes share the same pages.
+    """
+    version = version or read_current_version(index_dir)
+    if not version:
+        return None
+    version_dir = os.path.join(index_dir, version)
+    index_path = os.path.join(version_dir, "index.faiss")
+    if not os.path.exists(index_path):
+        return None
+
+    if mmap:
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Index types without mmap support are read into memory instead
+            index = faiss.read_index(index_path)
+    else:
+        index = faiss.read_index(index_path)
+    tune_index(index)
+
+    with open(os.path.join(version_dir, "docstore.json"), encoding="utf-8") as f:
+        documents = json.load(f)
+
+    docstore = InMemoryDocstore({
+        d["id"]: Document(page_content=d["page_content"], metadata=d["metadata"]) for d in documents
+    })
+    index_to_docstore_id = {position: d["id"] for position, d in enumerate(documents)}
+
+    vector_store = FAISS(
+        embedding_function=get_embeddings(api_key),
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+    vector_store.index_version = version
     return vector_store
 
 
+def reload_rag_db_if_changed(vector_store: Optional[FAISS], api_key: str, index_dir: str = RAG_INDEX_DIR) -> Optional[FAISS]:
+    """
+    Returns a freshly loaded store if CURRENT now points to another version than
+    vector_store (e.g. after an ingestion by another process), else vector_store itself.
+    """
+    current = read_current_version(index_dir)
+    if current is None or current == getattr(vector_store, "index_version", None):
+        return vector_store
+    print(f"--- RAG index changed to {current}; reloading ---")
+    return load_rag_db(api_key, index_dir, version=current) or vector_store
+
+
+def prune_rag_versions(index_dir: str = RAG_INDEX_DIR, keep: int = 3) -> None:
+    """
+    Deletes old version directories, keeping CURRENT and the newest `keep` versions.
+    Processes that still memory-map a deleted version keep working (POSIX unlink semantics).
+    """
+    current = read_current_version(index_dir)
+    versions = [
+        name for name in os.listdir(index_dir)
+        if not name.startswith(".") and os.path.isdir(os.path.join(index_dir, name))
+    ]
+    versions.sort(key=lambda name: os.path.getmtime(os.path.join(index_dir, name)), reverse=True)
+    for name in versions[keep:]:
+        if name != current:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+
+# ======================= INCREMENTAL INGESTION =======================
+
+@contextmanager
+def ingestion_lock(index_dir: str):
+    # One writer at a time per index directory (across processes); readers are never blocked.
+    import fcntl
+
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, ".ingest.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def split_document(doc_id: str, text: str, metadata: Optional[dict] = None) -> Tuple[List[str], List[dict], List[str]]:
+    """
+    Splits one source document into chunks.
+    Returns (chunk texts, chunk metadatas, chunk ids); chunk ids are "<doc_id>::<n>".
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    texts = splitter.split_text(text)
+    metadatas = [{**(metadata or {}), "doc_id": doc_id, "chunk": i} for i in range(len(texts))]
+    ids = [f"{doc_id}::{i}" for i in range(len(texts))]
+    return texts, metadatas, ids
+
+
+def _has_changes(registry: dict, upserts: Optional[List[dict]], deletes: Optional[List[str]]) -> bool:
+    # Would applying upserts/deletes change an index holding the documents in registry?
+    if any(doc_id in registry for doc_id in deletes or []):
+        return True
+    for doc in upserts or []:
+        previous = registry.get(doc["id"])
+        if previous is None:
+            if doc["text"].strip():  # empty documents have no chunks and are not registered
+                return True
+        elif previous["hash"] != document_hash(doc["text"], doc.get("metadata")):
+            return True
+    return False
+
+
+def update_rag_documents(api_key: str, upserts: Optional[List[dict]] = None, deletes: Optional[List[str]] = None,
+                         index_dir: str = RAG_INDEX_DIR) -> Optional[str]:
+    """
+    Adds, replaces or deletes documents in the saved index by document ID, then publishes
+    the result as a new index version (atomic CURRENT swap, safe while the app is serving).
+
+    Args:
+        upserts: [{"id": str, "text": str, "metadata": dict (optional)}, ...]; documents
+                 whose text and metadata are unchanged are skipped.
+        deletes: document IDs to remove.
+
+    Only chunks of new or changed documents are embedded (and unchanged chunk texts are
+    served from the embedding cache). Returns the CURRENT version afterwards.
+
+    When nothing changed (e.g. every API worker start) this only reads the manifest:
+    no lock is taken and the index is not loaded.
+    """
+    manifest = read_manifest(index_dir) or {}
+    if manifest.get("documents") and not _has_changes(manifest["documents"], upserts, deletes):
+        return manifest.get("version")
+
+    with ingestion_lock(index_dir):
+        # Another writer may have applied the same changes while we waited for the lock
+        manifest = read_manifest(index_dir) or {}
+        if manifest.get("documents") and not _has_changes(manifest["documents"], upserts, deletes):
+            return manifest.get("version")
+
+        # Indexes without a document registry cannot be updated in place and are rebuilt
+        vector_store = load_rag_db(api_key, index_dir, mmap=False) if manifest.get("documents") else None
+        registry = dict(manifest["documents"]) if vector_store is not None else {}
+
+        remove_ids, add_texts, add_metadatas, add_ids = [], [], [], []
+
+        for doc_id in deletes or []:
+            if doc_id in registry:
+                remove_ids.extend(registry.pop(doc_id)["chunks"])
+
+        for doc in upserts or []:
+            doc_hash = document_hash(doc["text"], doc.get("metadata"))
+            previous = registry.get(doc["id"])
+            if previous and previous["hash"] == doc_hash:
+                continue
+            if previous:
+                remove_ids.extend(previous["chunks"])
+            texts, metadatas, ids = split_document(doc["id"], doc["text"], doc.get("metadata"))
+            if not ids:
+                # Nothing to index: an emptied document is dropped, a new empty one ignored
+                registry.pop(doc["id"], None)
+                continue
+            registry[doc["id"]] = {"hash": doc_hash, "chunks": ids}
+            add_texts.extend(texts)
+            add_metadatas.extend(metadatas)
+            add_ids.extend(ids)
+
+        if not remove_ids and not add_ids:
+            return manifest.get("version") if vector_store is not None else None
+
+        index_spec = manifest.get("index_spec", "Flat")
+        if vector_store is not None and remove_ids:
+            vector_store = remove_chunks(vector_store, remove_ids, index_spec)
+        if add_ids:
+            if vector_store is None:
+                # New index: built as RAG_INDEX_SPEC (Flat while too small to train it)
+                embeddings = get_embeddings(api_key)
+                vectors = np.array(embeddings.embed_documents(add_texts), dtype="float32")
+                index, index_spec = build_initial_index(vectors)
+                docs = [Document(page_content=text, metadata=metadata) for text, metadata in zip(add_texts, add_metadatas)]
+                vector_store = _vector_store_from_index(index, docs, embeddings, add_ids)
+            else:
+                vector_store.add_texts(add_texts, metadatas=add_metadatas, ids=add_ids)
+
+        version = rag_registry_version(registry, index_spec)
+        save_rag_db(vector_store, version, index_dir, extra_manifest={"documents": registry, "index_spec": index_spec})
+        prune_rag_versions(index_dir)
+        print(f"✅ RAG index {version}: +{len(add_ids)} / -{len(remove_ids)} chunks.")
+        return version
+
+
+def delete_rag_documents(api_key: str, doc_ids: List[str], index_dir: str = RAG_INDEX_DIR) -> Optional[str]:
+    """
+    Removes documents from the saved index by document ID.
+    """
+    return update_rag_documents(api_key, deletes=doc_ids, index_dir=index_dir)
+
+
+def load_or_build_rag_db(documents, api_key: str, index_dir: str = RAG_INDEX_DIR) -> FAISS:
+    """
+    Returns the saved vector store, making sure it contains the given documents
+    ([{"id", "text", "metadata"}, ...], or a plain string stored as document "rag_sample").
+    Documents are only (re)chunked and embedded when they changed; otherwise the saved
+    artifact is memory-mapped as is.
+    """
+    if isinstance(documents, str):
+        documents = [{"id": "rag_sample", "text": documents}]
+    update_rag_documents(api_key, upserts=documents, index_dir=index_dir)
+    vector_store = load_rag_db(api_key, index_dir)
+    if vector_store is None:
+        raise ValueError("No RAG documents with content to index.")
+    print(f"✅ RAG index {vector_store.index_version} loaded from disk.")
+    return vector_store
+
+
+
+def rebuild_rag_index(api_key: str, index_spec: str = RAG_INDEX_SPEC, index_dir: str = RAG_INDEX_DIR) -> str:
+    """
+    Rebuilds the CURRENT index as another index type (e.g. "IVF4096,PQ64" once the corpus
+    has grown) and publishes it as a new version. Vectors are read back from the current
+    index (see index_vectors), so nothing is re-embedded.
+    Note: only Flat indexes delete vectors in place; with other types every later update
+    of existing documents rebuilds the index (see remove_chunks), reusing its training.
+    """
+    with ingestion_lock(index_dir):
+        manifest = read_manifest(index_dir)
+        vector_store = load_rag_db(api_key, index_dir, mmap=False)
+        if vector_store is None or not manifest.get("documents"):
+            raise ValueError(f"No RAG index with a document registry in {index_dir}.")
+
+        rebuilt = rebuild_vector_store(vector_store, index_spec)
+        registry = manifest["documents"]
+        version = rag_registry_version(registry, index_spec)
+        save_rag_db(rebuilt, version, index_dir, extra_manifest={"documents": registry, "index_spec": index_spec})
+        prune_rag_versions(index_dir)
+        print(f"✅ RAG index rebuilt as {index_spec}: {version} ({rebuilt.index.ntotal} vectors).")
+        return version
 
 
 
+# ======================= FILTERED RETRIEVAL =======================
 
+# Levels after Class 12, for content labelled by degree instead of class
+_DEGREE_LEVELS = {"bachelor": 13, "master": 14}
 
 
+def parse_class_range(label) -> Optional[Tuple[int, int]]:
+    """
+    "Class 7" -> (7, 7), "Class 6-8" -> (6, 8), "Class 11 (Science)" -> (11, 11),
+    "Bachelors" -> (13, 13). Returns None if the label names no class.
+    """
+    if label is None:
+        return None
+    label = str(label).lower()
+    for name, level in _DEGREE_LEVELS.items():
+        if name in label:
+            return level, level
+    match = re.search(r"(\d+)(?:\s*-\s*(\d+))?", label)
+    if not match:
+        return None
+    low = int(match.group(1))
+    return low, int(match.group(2) or low)
+
+
+def _normalize_subjects(subject) -> Tuple[str, ...]:
+    # "Math - Fractions" (auto-detect topics) filters on its subject part
+    if subject is None:
+        return ()
+    items = subject if isinstance(subject, (list, tuple)) else [subject]
+    return tuple(sorted({str(item).split(" - ")[0].strip().lower() for item in items if str(item).strip()}))
+
+
+def rag_filters(class_name, subject) -> dict:
+    """
+    Retrieval filters for a quiz: {"class_level": int or None, "subjects": (normalized subjects)}.
+    """
+    class_range = parse_class_range(class_name)
+    return {"class_level": class_range[0] if class_range else None, "subjects": _normalize_subjects(subject)}
+
+
+def _get_partitions(vector_store: FAISS) -> dict:
+    """
+    Groups index positions by (class range, subjects) metadata: {partition key: int64 positions}.
+    Built once per loaded store; a store loaded from disk is immutable.
+    """
+    # Adding or deleting chunks changes ntotal or replaces index_to_docstore_id
+    state = (vector_store.index.ntotal, id(vector_store.index_to_docstore_id))
+    partitions = getattr(vector_store, "rag_partitions", None)
+    if partitions is not None and partitions[0] == state:
+        return partitions[1]
+
+    grouped = {}
+    for position, doc_id in vector_store.index_to_docstore_id.items():
+        metadata = vector_store.docstore.search(doc_id).metadata or {}
+        key = (parse_class_range(metadata.get("class")), _normalize_subjects(metadata.get("subject")))
+        grouped.setdefault(key, []).append(position)
+    partitions = {key: np.array(sorted(positions), dtype="int64") for key, positions in grouped.items()}
+    vector_store.rag_partitions = (state, partitions)
+    return partitions
+
+
+def select_positions(vector_store: FAISS, filters: dict) -> Optional[np.ndarray]:
+    """
+    Index positions matching the filters (chunks without class/subject metadata match
+    everything). A subject filter that matches nothing (e.g. free-text General topics)
+    is relaxed to the class filter alone. Returns None when every position matches.
+    """
+    partitions = _get_partitions(vector_store)
+    level = filters.get("class_level")
+    subjects = set(filters.get("subjects") or ())
+
+    def class_ok(class_range):
+        return level is None or class_range is None or class_range[0] <= level <= class_range[1]
+
+    by_class = [(key, positions) for key, positions in partitions.items() if class_ok(key[0])]
+    selected = [positions for (_, doc_subjects), positions in by_class
+                if not subjects or not doc_subjects or subjects.intersection(doc_subjects)]
+    if subjects and not any(
+        subjects.intersection(doc_subjects) for (_, doc_subjects), _ in by_class
+    ):
+        selected = [positions for _, positions in by_class]
+
+    if len(selected) == len(partitions):
+        return None
+    if not selected:
+        return np.empty(0, dtype="int64")
+    return np.sort(np.concatenate(selected))
 
 
-def get_rag_context(query, vector_store: FAISS, k: int = 2) -> Optional[str]:
+def search_positions(vector_store: FAISS, query_vectors: np.ndarray, k: int,
+                     positions: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    k-NN search restricted to the given index positions (all if None).
+    Returns (distances, positions) arrays of shape (len(query_vectors), k); missing hits are -1.
+    Every index type searches with an ID selector, so nothing is copied per query.
+    """
+    index = vector_store.index
+    if positions is None:
+        return index.search(query_vectors, k)
+    if len(positions) == 0:
+        return (np.full((len(query_vectors), k), np.inf, dtype="float32"),
+                np.full((len(query_vectors), k), -1, dtype="int64"))
+
+    # Per-call search parameters replace the index defaults, so carry nprobe/efSearch over
+    selector = faiss.IDSelectorBatch(len(positions), faiss.swig_ptr(positions))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    elif hasattr(faiss.downcast_index(index), "hnsw"):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=faiss.downcast_index(index).hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(query_vectors, k, params=params)
+
+
+def _embed_queries(vector_store: FAISS, queries: List[str]) -> np.ndarray:
+    embeddings = vector_store.embeddings
+    if hasattr(embeddings, "embed_queries"):
+        vectors = embeddings.embed_queries(queries)
+    else:
+        vectors = [embeddings.embed_query(query) for query in queries]
+    return np.array(vectors, dtype="float32")
+
+
+rag_context_cache = TTLCache(maxsize=RAG_CACHE_SIZE, ttl=RAG_CACHE_TTL)
+_rag_cache_version = None
+_rag_cache_lock = threading.Lock()
+
+
+def _rag_cache_key(queries: List[str], k: int, filters: Optional[dict], token_budget: int, version) -> tuple:
+    normalized = tuple(dict.fromkeys(" ".join(q.lower().split()) for q in queries))
+    filter_key = tuple(sorted((key, tuple(value) if isinstance(value, (list, tuple)) else value)
+                              for key, value in (filters or {}).items()))
+    return normalized, k, filter_key, token_budget, version
+
+
+def get_rag_context(query, vector_store: FAISS, k: int = 2, filters: Optional[dict] = None,
+                    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET) -> Optional[str]:
     """
     Retrieves relevant context from the FAISS vector store based on the query.
     Returns a concatenated string of the top k relevant documents.
+    filters (see rag_filters) restricts the search to chunks for that class/subject.
+
+    query may be a list of topics: each topic gets its own top k, all topics are searched
+    in one FAISS call, and the results are merged round-robin (best hit of every topic
+    first), without duplicates, until token_budget (~4 characters per token) is used.
+
+    Results are served from rag_context_cache (LRU + TTL) when the same normalized query,
+    k and filters were retrieved before from the same index version; the cache is emptied
+    when a new index version is seen.
     """
+    global _rag_cache_version
 
-    # Ensure always a string
-    if isinstance(query, list):
-        query = ", ".join(str(item) for item in query)
-    docs = vector_store.similarity_search(query, k=k)
-    if not docs:
+    queries = [str(item) for item in query] if isinstance(query, (list, tuple)) else [query]
+    queries = list(dict.fromkeys(q for q in queries if q.strip())) or [", ".join(queries)]
+
+    version = getattr(vector_store, "index_version", None) or id(vector_store)
+    if version != _rag_cache_version:
+        with _rag_cache_lock:
+            if version != _rag_cache_version:
+                rag_context_cache.clear()
+                _rag_cache_version = version
+
+    return rag_context_cache.get_or_set(
+        _rag_cache_key(queries, k, filters, token_budget, version),
+        lambda: _search_rag_context(queries, vector_store, k, filters, token_budget),
+    )
+
+
+def _search_rag_context(queries: List[str], vector_store: FAISS, k: int, filters: Optional[dict],
+                        token_budget: int) -> Optional[str]:
+    positions = select_positions(vector_store, filters) if filters else None
+    _, found = search_positions(vector_store, _embed_queries(vector_store, queries), k, positions)
+
+    budget = token_budget * 4
+    seen = set()
+    contents = []
+    for rank in range(found.shape[1]):
+        for topic_hits in found:
+            position = int(topic_hits[rank])
+            if position < 0 or position in seen:
+                continue
+            seen.add(position)
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+            if contents and len(doc.page_content) > budget:
+                continue  # too large for what is left; smaller chunks may still fit
+            contents.append(doc.page_content)
+            budget -= len(doc.page_content)
+
+    if not contents:
         return None
-    return "\n\n".join(doc.page_content for doc in docs)
+    return "\n\n".join(contents)
+
+
+
+async def aget_rag_context(query, vector_store: FAISS, k: int = 2, filters: Optional[dict] = None,
+                           token_budget: int = RAG_CONTEXT_TOKEN_BUDGET) -> Optional[str]:
+    """
+    Async version of get_rag_context. The query embedding and FAISS search are
+    blocking calls, so they run in a worker thread instead of on the event loop.
+    """
+    return await asyncio.to_thread(get_rag_context, query, vector_store, k, filters, token_budget)
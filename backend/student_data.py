@@ -1,19 +1,434 @@
 # backend/student_data.py
 # it will store connect app with MongoDB cloud and save the quiz data into database.
 
-from typing import List, Dict, Optional
-from pymongo import MongoClient
+import os
+import re
+import copy
+import glob
+import json
+import time
+import uuid
+import fcntl
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from pymongo import MongoClient, UpdateOne
 from pymongo.server_api import ServerApi
 from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+from backend.cache import TTLCache
+
+
+# Read-through cache of student performance documents (per process: a write served by
+# another API worker is only seen here once the entry expires, so keep the TTL short)
+STUDENT_CACHE_SIZE = int(os.getenv("STUDENT_CACHE_SIZE", "10000"))
+STUDENT_CACHE_TTL = float(os.getenv("STUDENT_CACHE_TTL", "5"))
+
+# Optional write-behind of performance updates (see WriteBehindQueue)
+STUDENT_WRITE_BEHIND = os.getenv("STUDENT_WRITE_BEHIND", "0") == "1"
+STUDENT_WAL_PATH = os.getenv("STUDENT_WAL_PATH", "student_writes.wal")
+
+# Write IDs (write-behind batch IDs, or submit IDs of direct writes) kept per student
+# document to recognise replayed writes
+APPLIED_BATCHES_KEPT = 50
+
+
+
+def _apply_increment(document: Dict, path: str, value: int) -> None:
+    # Applies one dotted-path $inc to a plain dict, like MongoDB would
+    *parents, leaf = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[leaf] = document.get(leaf, 0) + value
+
+
+def _merge_increments(target: Dict[str, int], inc_fields: Dict[str, int]) -> None:
+    for path, value in inc_fields.items():
+        target[path] = target.get(path, 0) + value
+
+
+
+def select_weakest_topics(document: Optional[Dict], max_topics: int = 3, threshold: float = 0.9) -> List[str]:
+    """
+    The selection of DataStore.get_weakest_topics, on a student performance document.
+    """
+    subject_accs = {}
+    for subj, stats in ((document or {}).get("subjects") or {}).items():
+        if stats.get("total_attempts", 0) > 0:
+            subject_accs[subj] = stats.get("correct_count", 0) / stats["total_attempts"]
+    if not subject_accs:
+        return []
+
+    min_acc = min(subject_accs.values())
+    selected = []
+    for subj in sorted(s for s, acc in subject_accs.items() if acc == min_acc):
+        topic_accs = [
+            (topic, t_stats.get("correct_count", 0) / t_stats["total_attempts"])
+            for topic, t_stats in (document["subjects"][subj].get("topics") or {}).items()
+            if t_stats.get("total_attempts", 0) > 0
+        ]
+        weak_topics = [topic for topic, acc in sorted(topic_accs, key=lambda x: x[1]) if acc < threshold]
+        if weak_topics:
+            selected.extend(f"{subj} - {topic}" for topic in weak_topics[:max_topics])
+        else:
+            selected.append(subj)
+    return selected
+
+
+def _add_attempts_to_accuracy(rows: List[Dict], attempts: List[Dict], by_topic: bool) -> List[Dict]:
+    # Adds attempt records (not in MongoDB yet) to get_recent_accuracy rows, re-sorted
+    totals = {}
+    for row in rows:
+        key = (row["subject"], row["topic"]) if by_topic else (row["subject"],)
+        totals[key] = [row["total_attempts"], row["correct_count"]]
+    for attempt in attempts:
+        for r in attempt["results"]:
+            key = (r["subject"], r["topic"]) if by_topic else (r["subject"],)
+            counts = totals.setdefault(key, [0, 0])
+            counts[0] += 1
+            counts[1] += 1 if r["is_correct"] else 0
+
+    merged = [
+        {"subject": key[0], **({"topic": key[1]} if by_topic else {}),
+         "total_attempts": total, "correct_count": correct, "accuracy": correct / total}
+        for key, (total, correct) in totals.items()
+    ]
+    merged.sort(key=lambda row: (row["accuracy"], -row["total_attempts"]))
+    return merged
+
+
+
+def build_attempt(student_id: str, class_name: str, evaluation_results: List[Dict],
+                  attempt_id: Optional[str] = None) -> Dict:
+    """
+    One quiz_attempts record. The _id (the submit ID when given, else generated here) is
+    fixed before the first write, so writing the same attempt twice (a replayed
+    write-behind batch, a retried submit) cannot create a duplicate.
+    """
+    results = [
+        {"subject": r.get("subject", "Unknown"), "topic": r.get("topic", "Unknown"), "is_correct": bool(r["is_correct"])}
+        for r in evaluation_results
+    ]
+    return {
+        "_id": attempt_id or uuid.uuid4().hex,
+        "student_id": student_id,
+        "class": class_name,
+        "timestamp": time.time(),
+        "total": len(results),
+        "correct": sum(1 for r in results if r["is_correct"]),
+        "results": results,
+    }
+
+
+def _attempt_document(attempt: Dict) -> Dict:
+    # Epoch seconds (JSON friendly, used in the WAL) -> BSON date
+    return {**attempt, "timestamp": datetime.fromtimestamp(attempt["timestamp"], tz=timezone.utc)}
+
+
+def _raise_unless_duplicates(error: BulkWriteError) -> None:
+    # Duplicate key errors (11000) mean the document was already written
+    if any(e.get("code") != 11000 for e in error.details.get("writeErrors", [])):
+        raise error
+
+
+def insert_attempts(collection: Collection, attempts: List[Dict]) -> None:
+    """
+    Appends attempts to quiz_attempts, ignoring ones that were already written.
+    """
+    if not attempts:
+        return
+    try:
+        collection.insert_many([_attempt_document(a) for a in attempts], ordered=False)
+    except BulkWriteError as e:
+        _raise_unless_duplicates(e)
+
+
+def apply_increments(collection: Collection, students: Dict[str, Dict], write_id: str) -> None:
+    """
+    Applies {student_id: {"inc": {path: n}, "class": class_name}} to student_performance
+    once per write_id: documents that list write_id in applied_batches are skipped.
+    """
+    # Create missing student documents first, so the guarded $inc below needs no upsert
+    try:
+        collection.bulk_write([
+            UpdateOne({"student_id": student_id}, {"$setOnInsert": {"class": entry["class"]}}, upsert=True)
+            for student_id, entry in students.items()
+        ], ordered=False)
+    except BulkWriteError as e:
+        _raise_unless_duplicates(e)  # a concurrent first submit created the document
+
+    collection.bulk_write([
+        UpdateOne(
+            {"student_id": student_id, "applied_batches": {"$ne": write_id}},
+            {"$inc": entry["inc"],
+             "$push": {"applied_batches": {"$each": [write_id], "$slice": -APPLIED_BATCHES_KEPT}}},
+        )
+        for student_id, entry in students.items()
+    ], ordered=False)
+
+
+
+class WriteBehindQueue:
+    """
+    Buffers student performance increments in memory and writes them to MongoDB in
+    batches, so a quiz submit does not wait for the database.
+
+    Increments for the same student are merged into one $inc document and flushed with a
+    bulk_write when max_pending students are waiting or every flush_interval seconds.
+
+    Every increment is first appended to this process's write-ahead log (WAL),
+    "<wal_path>.<pid>", while the process holds an flock on "<wal_path>.<pid>.lock", so
+    several API workers never share a file. A flush turns the WAL into a batch file,
+    "<wal_path>.<pid>.batch-<batch_id>", which is deleted once written; a failed batch
+    stays queued and is retried. On startup the files of workers that no longer hold
+    their lock (crashed) are taken over and written. Each student document records the
+    last APPLIED_BATCHES_KEPT batch IDs applied to it (applied_batches) and a batch is
+    skipped for documents that already list it, so a replayed batch is never counted twice.
+
+    That guarantee is bounded: a batch that was written but whose file survived (crash
+    between the write and the file removal) is only recognised while it is among the
+    student's last APPLIED_BATCHES_KEPT batches. If the student gets that many newer
+    batches (from any worker) before the crashed worker's files are taken over, the
+    replay counts it again. The list also costs about 40 bytes per kept ID in every
+    student document; it is projected out of every read.
+    """
+
+    def __init__(self, collection: Collection, wal_path: str = STUDENT_WAL_PATH, max_pending: int = 500,
+                 flush_interval: float = 2.0, on_flush=None, attempts_collection: Optional[Collection] = None):
+        """
+        Args:
+            collection (Collection): the student_performance collection.
+            attempts_collection (Collection): the quiz_attempts collection, for queued attempt records.
+            wal_path (str): base path of the WAL files (see above).
+            max_pending (int): number of students with pending increments that triggers a flush.
+            flush_interval (float): max seconds an increment waits before it is flushed.
+            on_flush: called with the flushed student IDs after every written batch, while
+                      the batch is removed from pending_for (under the queue lock).
+        """
+        self.collection = collection
+        self.attempts_collection = attempts_collection
+        self.base_path = wal_path
+        self.wal_path = f"{wal_path}.{os.getpid()}"
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.flushed_batches = 0
+
+        self._pending = {}   # student_id -> {"inc": {path: n}, "class": class_name}
+        self._pending_attempts = []
+        self._batches = []   # closed batches not written yet: {"id", "path", "students", "attempts"}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+
+        directory = os.path.dirname(wal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._owner_lock = open(self.wal_path + ".lock", "a")
+        fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+        self._adopt_orphans()
+        self._load_batches()
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+
+        self._thread = threading.Thread(target=self._run, name="student-write-behind", daemon=True)
+        self._thread.start()
+
+    # ---------------- queue ----------------
+
+    def _merge(self, target: Dict, student_id: str, class_name: str, inc_fields: Dict[str, int]) -> None:
+        entry = target.setdefault(student_id, {"inc": {}, "class": class_name})
+        _merge_increments(entry["inc"], inc_fields)
+
+    def enqueue(self, student_id: str, class_name: str, inc_fields: Dict[str, int], attempt: Optional[Dict] = None) -> None:
+        with self._lock:
+            self._wal.write(json.dumps({"student_id": student_id, "class": class_name, "inc": inc_fields,
+                                        "attempt": attempt}) + "\n")
+            self._wal.flush()
+            self._merge(self._pending, student_id, class_name, inc_fields)
+            if attempt is not None:
+                self._pending_attempts.append(attempt)
+            if len(self._pending) >= self.max_pending:
+                self._wake.set()
+
+    def pending_for(self, student_id: str, applied: Iterable[str] = ()) -> Tuple[Dict[str, int], Optional[str]]:
+        """
+        Increments not yet visible in MongoDB for the student, and the class to insert with.
+        applied: the document's applied_batches; those batches are already included in it.
+        """
+        applied = set(applied)
+        inc, class_name = {}, None
+        with self._lock:
+            entries = [batch["students"].get(student_id) for batch in self._batches if batch["id"] not in applied]
+            for entry in entries + [self._pending.get(student_id)]:
+                if entry:
+                    _merge_increments(inc, entry["inc"])
+                    class_name = class_name or entry["class"]
+        return inc, class_name
+
+    def pending_attempts(self, student_id: str) -> List[Dict]:
+        """
+        The student's queued attempt records, including those of batches being written
+        (which may already be in quiz_attempts: match them by _id).
+        """
+        with self._lock:
+            attempts = [a for batch in self._batches for a in batch["attempts"]] + self._pending_attempts
+        return [a for a in attempts if a["student_id"] == student_id]
+
+    # ---------------- flushing ----------------
+
+    def flush(self) -> int:
+        """
+        Writes every queued batch, then all pending increments. Returns the number of
+        student updates written. On failure the batch stays queued (and on disk) and the
+        error is raised.
+        """
+        with self._flush_lock:
+            written = self._write_batches()
+            with self._lock:
+                if self._pending:
+                    self._close_batch()
+            return written + self._write_batches()
+
+    def _close_batch(self) -> None:
+        # Called with _lock held: the pending increments and their WAL become a batch
+        batch_id = uuid.uuid4().hex
+        path = f"{self.wal_path}.batch-{batch_id}"
+        self._wal.close()
+        os.replace(self.wal_path, path)
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._batches.append({"id": batch_id, "path": path, "students": self._pending, "attempts": self._pending_attempts})
+        self._pending, self._pending_attempts = {}, []
+
+    def _write_batches(self) -> int:
+        with self._lock:
+            batches = list(self._batches)
+        written = 0
+        for batch in batches:
+            self._write_batch(batch)
+            with self._lock:
+                # Leave the read overlay and the readers' caches in one step
+                self._batches.remove(batch)
+                if self.on_flush:
+                    self.on_flush(list(batch["students"]))
+            os.remove(batch["path"])
+            written += len(batch["students"])
+            self.flushed_batches += 1
+        return written
+
+    def _write_batch(self, batch: Dict) -> None:
+        if self.attempts_collection is not None:
+            insert_attempts(self.attempts_collection, batch["attempts"])
+        apply_increments(self.collection, batch["students"], batch["id"])
+
+    # ---------------- recovery ----------------
+
+    def _adopt_orphans(self) -> None:
+        # Moves the files of workers that no longer hold their lock (and leftovers of a dead
+        # process that had our PID) into batch files of this process
+        directory = os.path.dirname(self.base_path) or "."
+        pattern = re.compile(re.escape(os.path.basename(self.base_path)) + r"\.(\d+)(\.lock|\.batch-[0-9a-f]+)?$")
+        owners = set()
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if match:
+                owners.add(match.group(1))
+
+        for owner in sorted(owners):
+            prefix = f"{self.base_path}.{owner}"
+            if prefix == self.wal_path:
+                self._adopt_files(prefix)
+                continue
+            with open(prefix + ".lock", "a") as owner_lock:
+                try:
+                    fcntl.flock(owner_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # still running
+                self._adopt_files(prefix)
+                try:
+                    os.remove(prefix + ".lock")
+                except FileNotFoundError:
+                    pass  # another worker adopted it first
+
+    def _adopt_files(self, prefix: str) -> None:
+        # Its WAL was never part of a batch, so it becomes a new one; its batches keep their IDs
+        if os.path.exists(prefix):
+            if os.path.getsize(prefix):
+                os.replace(prefix, f"{self.wal_path}.batch-{uuid.uuid4().hex}")
+            else:
+                os.remove(prefix)
+        if prefix != self.wal_path:
+            for path in glob.glob(glob.escape(prefix) + ".batch-*"):
+                os.replace(path, self.wal_path + path[len(prefix):])
+
+    def _load_batches(self) -> None:
+        paths = sorted(glob.glob(glob.escape(self.wal_path) + ".batch-*"), key=os.path.getmtime)
+        replayed = 0
+        for path in paths:
+            batch = {"id": path.rsplit(".batch-", 1)[1], "path": path, "students": {}, "attempts": []}
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash mid-write
+                    self._merge(batch["students"], entry["student_id"], entry["class"], entry["inc"])
+                    if entry.get("attempt") is not None:
+                        batch["attempts"].append(entry["attempt"])
+                    replayed += 1
+            self._batches.append(batch)
+        if replayed:
+            print(f"--- Write-behind: replaying {replayed} queued update(s) from {len(paths)} batch file(s) ---")
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Write-behind flush failed (will retry): {e}")
+
+    def close(self) -> None:
+        """
+        Stops the background thread and flushes what is left. Anything that cannot be
+        written stays on disk and is taken over by the next worker that starts.
+        """
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        try:
+            self.flush()
+        finally:
+            self._wal.close()
+            with self._lock:
+                done = not self._pending and not self._batches
+            if done:
+                os.remove(self.wal_path)
+                os.remove(self.wal_path + ".lock")
+            self._owner_lock.close()
+
+
+
 
 class DataStore:
-    def __init__(self, mongo_uri: str):
+    def __init__(self, mongo_uri: str, cache_size: int = STUDENT_CACHE_SIZE, cache_ttl: float = STUDENT_CACHE_TTL,
+                 write_behind: bool = STUDENT_WRITE_BEHIND, wal_path: str = STUDENT_WAL_PATH):
         """
         Initialize the connection to MongoDB.
         Connect with ServerApi version 1 for forward compatibility
 
         Args:
             mongo_uri (str): MongoDB connection URI.
+            cache_size (int): max student documents kept in the read-through cache (0 disables it).
+            cache_ttl (float): seconds a cached document is served before it is re-read;
+                               bounds staleness from writes made by other processes.
+            write_behind (bool): queue performance updates and write them in batches
+                                 (see WriteBehindQueue); reads include queued updates.
+            wal_path (str): write-ahead log of the write-behind queue.
         
         Database: quiz_app
         Collection : student_performance
@@ -21,15 +436,283 @@ class DataStore:
         self.client = MongoClient(mongo_uri, server_api=ServerApi('1'))
         self.db = self.client["quiz_app"]
         self.performance = self.db["student_performance"]
+        self.attempts = self.db["quiz_attempts"]  # append-only, one document per submitted quiz
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl) if cache_size > 0 else None
+        self._generation = 0  # bumped on every invalidation, see _cached
+        self._generation_lock = threading.Lock()
+        self.ensure_indexes()
+        self.write_behind = None
+        if write_behind:
+            self.write_behind = WriteBehindQueue(self.performance, wal_path, on_flush=self._invalidate_students,
+                                                 attempts_collection=self.attempts)
+
+    def close(self) -> None:
+        """
+        Flushes queued updates and closes the MongoDB connection.
+        """
+        if self.write_behind is not None:
+            self.write_behind.close()
+        self.client.close()
+
+    def ensure_indexes(self) -> None:
+        """
+        Unique index on student_id, so lookups and upserts are index seeks instead of
+        collection scans (and concurrent first submits cannot create duplicate students),
+        and (student_id, timestamp) on quiz_attempts for time-windowed queries.
+        Creating an index that already exists is a no-op.
+        """
+        try:
+            try:
+                self.performance.create_index("student_id", unique=True, name="student_id_unique")
+            except OperationFailure as e:
+                # Existing duplicate student documents block the unique index; still index the field
+                print(f"⚠️ Could not create unique index on student_id ({e}); creating a non-unique one.")
+                self.performance.create_index("student_id", name="student_id")
+            self.attempts.create_index([("student_id", 1), ("timestamp", -1)], name="student_id_timestamp")
+        except PyMongoError as e:
+            print(f"⚠️ Could not ensure MongoDB indexes: {e}")
+
+    def _cached(self, key, load):
+        # Read-through helper: cached documents are returned as copies. Missing students are
+        # not cached, so a first submit handled by another worker is visible immediately,
+        # and neither is a load that overlapped an invalidation (it may predate the write).
+        if self.cache is None:
+            return load()
+        document = self.cache.get(key)
+        if document is None:
+            generation = self._generation
+            document = load()
+            if document is None:
+                return None
+            if generation == self._generation:
+                self.cache.set(key, document)
+        return copy.deepcopy(document)
+
+    def _invalidate(self, student_id: str, subjects) -> None:
+        if self.cache is None:
+            return
+        with self._generation_lock:
+            self._generation += 1
+        self.cache.pop(student_id)
+        self.cache.pop(("summary", student_id))
+        self.cache.pop_where(lambda key: isinstance(key, tuple) and key[:2] == ("weakest", student_id))
+        for subj in subjects:
+            self.cache.pop(("topics", student_id, subj))
+
+    def _invalidate_students(self, student_ids: List[str]) -> None:
+        # After a write-behind flush; the flushed subjects are unknown here, so drop all topic entries
+        for student_id in student_ids:
+            self._invalidate(student_id, [])
+        if self.cache is not None:
+            flushed = set(student_ids)
+            self.cache.pop_where(lambda key: isinstance(key, tuple) and key[0] == "topics" and key[1] in flushed)
+
+    def _with_pending(self, student_id: str, document: Optional[Dict], include_topics: bool = True) -> Optional[Dict]:
+        # Overlay increments still queued in the write-behind queue, except batches the
+        # document already includes
+        applied = document.pop("applied_batches", []) if document is not None else []
+        if self.write_behind is None:
+            return document
+        inc_fields, class_name = self.write_behind.pending_for(student_id, applied)
+        if not inc_fields:
+            return document
+        if document is None:
+            document = {"student_id": student_id, "class": class_name}
+        for path, value in inc_fields.items():
+            if include_topics or ".topics." not in path:
+                _apply_increment(document, path, value)
+        return document
 
     def get_student_performance(self, student_id: str) -> Optional[Dict]:
         """
         Returns student performance document for the given student_id,
         or None if not found.
+        Served from the in-process cache when possible; callers get their own copy.
         """
-        return self.performance.find_one({"student_id": student_id})
+        document = self._cached(student_id, lambda: self.performance.find_one({"student_id": student_id}))
+        return self._with_pending(student_id, document)
+
+    def get_student_summary(self, student_id: str) -> Optional[Dict]:
+        """
+        Returns class, overall totals and per-subject totals, without the topic breakdown
+        (what the sidebar and subject selection need), or None if not found.
+        """
+        def load():
+            documents = list(self.performance.aggregate([
+                {"$match": {"student_id": student_id}},
+                {"$limit": 1},
+                {"$project": {
+                    "_id": 0,
+                    "student_id": 1,
+                    "class": 1,
+                    "total_questions_attempted": 1,
+                    "total_correct_answers": 1,
+                    "total_incorrect_answers": 1,
+                    "applied_batches": 1,
+                    "subjects": {"$arrayToObject": {"$map": {
+                        "input": {"$objectToArray": {"$ifNull": ["$subjects", {}]}},
+                        "as": "s",
+                        "in": {"k": "$$s.k", "v": {
+                            "total_attempts": "$$s.v.total_attempts",
+                            "correct_count": "$$s.v.correct_count",
+                        }},
+                    }}},
+                }},
+            ]))
+            return documents[0] if documents else None
+
+        return self._with_pending(student_id, self._cached(("summary", student_id), load), include_topics=False)
 
-    def update_student_performance(self, student_id: str, class_name: str, evaluation_results: List[Dict]) -> None:
+    def get_subject_topics(self, student_id: str, subject: str) -> Dict[str, Dict]:
+        """
+        Returns {topic: {"total_attempts", "correct_count"}} for one subject of the student
+        (empty if the student or subject is unknown).
+        """
+        def load():
+            document = self.performance.find_one(
+                {"student_id": student_id}, {"_id": 0, f"subjects.{subject}.topics": 1, "applied_batches": 1}
+            ) or {}
+            return {
+                "topics": document.get("subjects", {}).get(subject, {}).get("topics", {}),
+                "applied_batches": document.get("applied_batches", []),
+            }
+
+        cached = self._cached(("topics", student_id, subject), load)
+        topics = cached["topics"]
+        if self.write_behind is not None:
+            prefix = f"subjects.{subject}.topics."
+            for path, value in self.write_behind.pending_for(student_id, cached["applied_batches"])[0].items():
+                if path.startswith(prefix):
+                    _apply_increment(topics, path[len(prefix):], value)
+        return topics
+
+    def _has_pending(self, student_id: str) -> bool:
+        # Aggregation pipelines only see MongoDB, not the write-behind queue
+        return self.write_behind is not None and bool(self.write_behind.pending_for(student_id)[0])
+
+    def cache_stats(self) -> Dict[str, int]:
+        """
+        Hit/miss/eviction counters of the student document cache.
+        """
+        return self.cache.stats() if self.cache is not None else {}
+
+    def get_weakest_topics(self, student_id: str, max_topics: int = 3, threshold: float = 0.9) -> List[str]:
+        """
+        Picks what an auto-detect quiz should cover, inside MongoDB: the subject(s) with the
+        lowest accuracy and, for each, up to max_topics weakest topics below threshold
+        accuracy, as "Subject - Topic" strings (just "Subject" if no topic is below it).
+        Returns [] for a new student or one without attempts.
+        While the student has queued write-behind updates, the same selection runs in
+        Python on the document with those updates applied (and is not cached).
+        """
+        if self._has_pending(student_id):
+            return select_weakest_topics(self.get_student_performance(student_id), max_topics, threshold)
+
+        pipeline = [
+            {"$match": {"student_id": student_id}},
+            {"$limit": 1},
+            {"$project": {"_id": 0, "subjects": {"$objectToArray": {"$ifNull": ["$subjects", {}]}}}},
+            {"$unwind": "$subjects"},
+            {"$match": {"subjects.v.total_attempts": {"$gt": 0}}},
+            {"$project": {
+                "subject": "$subjects.k",
+                "accuracy": {"$divide": ["$subjects.v.correct_count", "$subjects.v.total_attempts"]},
+                "topics": {"$objectToArray": {"$ifNull": ["$subjects.v.topics", {}]}},
+            }},
+            # Keep only the minimum-accuracy subject(s)
+            {"$group": {"_id": None, "min_accuracy": {"$min": "$accuracy"}, "subjects": {"$push": "$$ROOT"}}},
+            {"$unwind": "$subjects"},
+            {"$match": {"$expr": {"$eq": ["$subjects.accuracy", "$min_accuracy"]}}},
+            {"$replaceRoot": {"newRoot": "$subjects"}},
+            # Rank their topics by accuracy
+            {"$unwind": {"path": "$topics", "preserveNullAndEmptyArrays": True}},
+            {"$project": {
+                "subject": 1,
+                "topic": "$topics.k",
+                "accuracy": {"$cond": [
+                    {"$gt": [{"$ifNull": ["$topics.v.total_attempts", 0]}, 0]},
+                    {"$divide": ["$topics.v.correct_count", "$topics.v.total_attempts"]},
+                    None,
+                ]},
+            }},
+            {"$sort": {"subject": 1, "accuracy": 1}},
+            {"$group": {"_id": "$subject", "topics": {"$push": {"topic": "$topic", "accuracy": "$accuracy"}}}},
+            {"$project": {
+                "_id": 0,
+                "subject": "$_id",
+                "topics": {"$slice": [
+                    {"$map": {
+                        "input": {"$filter": {
+                            "input": "$topics",
+                            "as": "t",
+                            "cond": {"$and": [{"$ne": ["$$t.accuracy", None]}, {"$lt": ["$$t.accuracy", threshold]}]},
+                        }},
+                        "as": "t",
+                        "in": "$$t.topic",
+                    }},
+                    max_topics,
+                ]},
+            }},
+            {"$sort": {"subject": 1}},
+        ]
+
+        def load():
+            selected = []
+            for row in self.performance.aggregate(pipeline):
+                if row["topics"]:
+                    selected.extend(f"{row['subject']} - {topic}" for topic in row["topics"])
+                else:
+                    selected.append(row["subject"])
+            # Like a missing student, an empty selection is not cached: the first submit
+            # may be written by another worker
+            return selected or None
+
+        return self._cached(("weakest", student_id, max_topics, threshold), load) or []
+
+    def get_recent_accuracy(self, student_id: str, days: int = 7, by_topic: bool = False) -> List[Dict]:
+        """
+        Accuracy over the student's attempts of the last `days` days, computed by MongoDB.
+        Returns [{"subject", ("topic",) "total_attempts", "correct_count", "accuracy"}, ...],
+        weakest first. In write-behind mode the student's queued attempts are added to
+        MongoDB's counts.
+        """
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        group_id = {"subject": "$results.subject"}
+        if by_topic:
+            group_id["topic"] = "$results.topic"
+
+        match = {"student_id": student_id, "timestamp": {"$gte": since}}
+        queued = self.write_behind.pending_attempts(student_id) if self.write_behind is not None else []
+        if queued:
+            # A batch being written may have inserted them already: count those from the queue
+            match["_id"] = {"$nin": [a["_id"] for a in queued]}
+
+        pipeline = [
+            {"$match": match},
+            {"$unwind": "$results"},
+            {"$group": {
+                "_id": group_id,
+                "total_attempts": {"$sum": 1},
+                "correct_count": {"$sum": {"$cond": ["$results.is_correct", 1, 0]}},
+            }},
+            {"$project": {
+                "_id": 0,
+                "subject": "$_id.subject",
+                **({"topic": "$_id.topic"} if by_topic else {}),
+                "total_attempts": 1,
+                "correct_count": 1,
+                "accuracy": {"$divide": ["$correct_count", "$total_attempts"]},
+            }},
+            {"$sort": {"accuracy": 1, "total_attempts": -1}},
+        ]
+        rows = list(self.attempts.aggregate(pipeline))
+        if not queued:
+            return rows
+        recent = [a for a in queued if a["timestamp"] >= since.timestamp()]
+        return _add_attempts_to_accuracy(rows, recent, by_topic)
+
+    def update_student_performance(self, student_id: str, class_name: str, evaluation_results: List[Dict],
+                                   submit_id: Optional[str] = None) -> None:
         """
         Update or insert aggregate student performance data based on a new quiz attempt.
 
@@ -39,6 +722,9 @@ class DataStore:
                 - 'subject': str
                 - 'topic': str
                 - 'is_correct': bool
+            submit_id: ID of the submission, the attempt's _id. Calling this again with the
+                       same submit_id (a retry) records nothing new, as long as the student
+                       had fewer than APPLIED_BATCHES_KEPT writes in between.
         """
 
         total_attempts = len(evaluation_results)
@@ -82,12 +768,56 @@ class DataStore:
                 inc_fields[f"{subj_prefix}.topics.{topic}.total_attempts"] = t_stats["total_attempts"]
                 inc_fields[f"{subj_prefix}.topics.{topic}.correct_count"] = t_stats["correct_count"]
 
-        # Perform atomic upsert
-        self.performance.update_one(
-            {"student_id": student_id},
-            {
-            "$inc": inc_fields,
-            "$setOnInsert": {"class": class_name}
-            },
-            upsert=True
-        )
+        attempt = build_attempt(student_id, class_name, evaluation_results, submit_id)
+
+        if self.write_behind is not None:
+            # Returns immediately; reads see the queued increments until they are flushed
+            self.write_behind.enqueue(student_id, class_name, inc_fields, attempt)
+            return
+
+        # Raw attempt history (for time-windowed analytics), then the lifetime counters;
+        # both are keyed by the attempt's _id, so a retry after a partial write completes it
+        insert_attempts(self.attempts, [attempt])
+        apply_increments(self.performance, {student_id: {"inc": inc_fields, "class": class_name}}, attempt["_id"])
+        # next reads fetch the updated document (only the attempted subjects' topics changed)
+        self._invalidate(student_id, subjects_agg)
+
+
+
+
+class AsyncDataStore:
+    """
+    Async interface to the same MongoDB data, for the async backend entry points.
+
+    pymongo calls run in worker threads (the same approach motor uses internally), so the
+    event loop is never blocked while the sync DataStore keeps a single implementation
+    of every query and one shared connection pool.
+    """
+
+    def __init__(self, mongo_uri: Optional[str] = None, data_store: Optional[DataStore] = None):
+        """
+        Args:
+            mongo_uri (str): MongoDB connection URI (ignored when data_store is given).
+            data_store (DataStore): existing store to share its connection pool.
+        """
+        self.sync = data_store if data_store is not None else DataStore(mongo_uri)
+
+    async def get_student_performance(self, student_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.sync.get_student_performance, student_id)
+
+    async def get_student_summary(self, student_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.sync.get_student_summary, student_id)
+
+    async def get_subject_topics(self, student_id: str, subject: str) -> Dict[str, Dict]:
+        return await asyncio.to_thread(self.sync.get_subject_topics, student_id, subject)
+
+    async def get_weakest_topics(self, student_id: str, max_topics: int = 3, threshold: float = 0.9) -> List[str]:
+        return await asyncio.to_thread(self.sync.get_weakest_topics, student_id, max_topics, threshold)
+
+    async def get_recent_accuracy(self, student_id: str, days: int = 7, by_topic: bool = False) -> List[Dict]:
+        return await asyncio.to_thread(self.sync.get_recent_accuracy, student_id, days, by_topic)
+
+    async def update_student_performance(self, student_id: str, class_name: str, evaluation_results: List[Dict],
+                                         submit_id: Optional[str] = None) -> None:
+        await asyncio.to_thread(self.sync.update_student_performance, student_id, class_name, evaluation_results,
+                                submit_id)
@@ -0,0 +1,84 @@
+# benchmarks/bench_ann_index.py
+# Recall vs. latency of the approximate RAG index types (backend.rag_vector_store.build_ann_index)
+# against the exact flat index, on synthetic clustered embeddings of the Gemini
+# embedding size (768). No API key needed.
+#
+# Usage:
+#     python -m benchmarks.bench_ann_index [num_vectors] [num_queries]
+
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from backend.rag_vector_store import build_ann_index, tune_index
+
+
+DIM = 768
+K = 10
+
+# (index spec, search knob name, values to sweep)
+CONFIGS = [
+    ("IVF{nlist},Flat", "nprobe", [1, 4, 16, 64]),
+    ("IVF{nlist},PQ64", "nprobe", [1, 4, 16, 64]),
+    ("HNSW32", "efSearch", [16, 32, 64, 128]),
+]
+
+
+
+def synthetic_embeddings(num_vectors: int, num_queries: int, seed: int = 0):
+    # Clustered data (like topic-grouped chunks) with unit-normalized vectors
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(num_vectors // 500, 8), DIM)).astype("float32")
+
+    def sample(n):
+        points = centers[rng.integers(len(centers), size=n)] + 0.5 * rng.standard_normal((n, DIM)).astype("float32")
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(num_vectors), sample(num_queries)
+
+
+def time_queries(index, queries) -> float:
+    # One query at a time, like get_rag_context; returns ms per query
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query[None, :], K)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def recall_at_k(found, truth) -> float:
+    return float(np.mean([len(set(f) & set(t)) / K for f, t in zip(found, truth)]))
+
+
+
+def main(num_vectors: int = 200_000, num_queries: int = 200):
+    vectors, queries = synthetic_embeddings(num_vectors, num_queries)
+    nlist = int(4 * np.sqrt(num_vectors))
+
+    flat = build_ann_index(vectors, "Flat")
+    _, truth = flat.search(queries, K)
+    rows = [("Flat", "-", time_queries(flat, queries), 1.0, 0.0)]
+
+    for spec_template, knob, values in CONFIGS:
+        spec = spec_template.format(nlist=nlist)
+        start = time.perf_counter()
+        index = build_ann_index(vectors, spec)
+        build_seconds = time.perf_counter() - start
+        for value in values:
+            tune_index(index, **{"nprobe" if knob == "nprobe" else "ef_search": value})
+            _, found = index.search(queries, K)
+            rows.append((spec, f"{knob}={value}", time_queries(index, queries), recall_at_k(found, truth), build_seconds))
+
+    print(f"{num_vectors} vectors x {DIM} dims, {num_queries} queries, recall@{K} vs. exact search "
+          f"(faiss threads: {faiss.omp_get_max_threads()}):")
+    print(f"{'index':<22}{'setting':<14}{'ms/query':>10}{'recall':>9}{'build s':>10}")
+    for spec, setting, latency, recall, build_seconds in rows:
+        print(f"{spec:<22}{setting:<14}{latency:>10.3f}{recall:>9.3f}{build_seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+    )
@@ -0,0 +1,120 @@
+# benchmarks/bench_graph_compile.py
+# Measures per-request overhead of building the LangGraph workflows on every quiz
+# versus reusing the compiled graphs from backend.graph_registry.
+#
+# The LLM (local fake backend) and MongoDB calls are faked so only graph overhead is timed.
+#
+# Usage:
+#     python -m benchmarks.bench_graph_compile [iterations]
+
+import io
+import sys
+import time
+from contextlib import redirect_stdout
+
+import backend.langgraph_workflow as generation
+import backend.quiz_evaluation_graph as evaluation
+from backend.graph_registry import clear_compiled_graphs
+from backend.async_utils import run_sync
+from backend.llm_client import use_fake_llm
+from backend.question_parser import parse_questions
+
+
+
+FAKE_QUIZ_TEXT = """
+1. Question: What is 2 + 2?
+A. 3
+B. 4
+C. 5
+D. 6
+Answer: B
+"""
+
+
+class FakeDataStore:
+    def update_student_performance(self, student_id, class_name, evaluation_results, submit_id=None):
+        return None
+
+
+async def fake_classify(questions, *args, **kwargs):
+    return [("Math", "Addition")] * len(questions)
+
+async def fake_report(results, language="English", use_llm=False):
+    return "report"
+
+async def fake_feedback(results, language="English"):
+    return "feedback"
+
+
+def install_fakes():
+    use_fake_llm([FAKE_QUIZ_TEXT * 5])
+    evaluation.aclassify_subject_topics_batch = fake_classify
+    evaluation.agenerate_performance_report = fake_report
+    evaluation.agenerate_personalized_feedback = fake_feedback
+
+
+
+def run_generation_uncached():
+    app = generation.build_quiz_generation_graph()
+    return run_sync(app.ainvoke({
+        "n": 5, "class_name": "Class 5", "subject": "Math", "language": "English",
+        "include_rag": False, "rag_context": None, "raw_quiz_text": None,
+        "parsed_questions": [], "evaluation_result": None, "retries": 0, "vector_store": None,
+    }))
+
+
+def run_generation_cached():
+    return generation.run_quiz_generation_agent(5, "Class 5", "Math", "English", include_rag=False)
+
+
+def run_evaluation_uncached(questions):
+    app = evaluation.build_quiz_evaluation_graph()
+    return run_sync(app.ainvoke({
+        "student_id": "bench", "questions": questions, "answers": ["B"] * len(questions),
+        "language": "English", "evaluation_results": [], "performance_report": "", "feedback": "",
+        "data_store": FakeDataStore(), "class_selected": "Class 5", "selected_subject": "Math",
+        "general_topics": [], "auto_detect": False,
+    }))
+
+
+def run_evaluation_cached(questions):
+    return evaluation.run_quiz_evaluation_agent(
+        "bench", questions, ["B"] * len(questions), "English", FakeDataStore(),
+        "Class 5", "Math", [], auto_detect=False,
+    )
+
+
+
+def time_per_call(func, iterations: int) -> float:
+    # Graph nodes print progress; keep the benchmark output readable.
+    with redirect_stdout(io.StringIO()):
+        func()  # warm-up (imports, first compile)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1000
+
+
+
+def main(iterations: int = 200):
+    install_fakes()
+    clear_compiled_graphs()
+
+    questions = parse_questions(FAKE_QUIZ_TEXT * 5)
+
+    rows = [
+        ("generation", time_per_call(run_generation_uncached, iterations),
+         time_per_call(run_generation_cached, iterations)),
+        ("evaluation", time_per_call(lambda: run_evaluation_uncached([dict(q) for q in questions]), iterations),
+         time_per_call(lambda: run_evaluation_cached([dict(q) for q in questions]), iterations)),
+    ]
+
+    print(f"Per-request overhead over {iterations} iterations (fake LLM, fake DB):")
+    print(f"{'graph':<12}{'build every call':>20}{'compiled once':>18}{'speedup':>10}")
+    for name, before, after in rows:
+        print(f"{name:<12}{before:>17.3f} ms{after:>15.3f} ms{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,84 @@
+# benchmarks/bench_quiz_parser.py
+# Compares the previous regex-based evaluate/parse steps with the single-pass
+# QuizStreamParser on well-formed and adversarial LLM output of growing size.
+#
+# Usage:
+#     python -m benchmarks.bench_quiz_parser
+
+import re
+import time
+
+from backend.question_parser import parse_quiz_text
+
+
+
+# The patterns used by evaluate_quiz_format / parse_questions before the single-pass parser
+LEGACY_MARKER = r"\d+\.\s*Question:"
+LEGACY_FORMAT = r"Question:.*?A\..*?B\..*?C\..*?D\..*?Answer:\s*[ABCD]"
+LEGACY_PARSE = r"\d+\.\s*Question:(.*?)\s*A\.(.*?)\s*B\.(.*?)\s*C\.(.*?)\s*D\.(.*?)\s*Answer:\s*([ABCD])"
+
+
+def legacy_evaluate_and_parse(raw_text: str):
+    if not re.search(LEGACY_MARKER, raw_text):
+        return []
+    if not re.search(LEGACY_FORMAT, raw_text, re.DOTALL):
+        return []
+    return re.findall(LEGACY_PARSE, raw_text, re.DOTALL)
+
+
+
+def well_formed(n: int) -> str:
+    return "".join(
+        f"{i}. Question: What is {i} + {i}?\nA. {i}\nB. {2 * i}\nC. {3 * i}\nD. {4 * i}\nAnswer: B\n\n"
+        for i in range(1, n + 1)
+    )
+
+
+def missing_answers(n: int) -> str:
+    # Options present but no "Answer:" line: every lazy group scans to the end of the text.
+    return "".join(
+        f"{i}. Question: What is {i} + {i}?\nA. {i}\nB. {2 * i}\nC. {3 * i}\nD. {4 * i}\n\n"
+        for i in range(1, n + 1)
+    )
+
+
+def markers_only(n: int) -> str:
+    # Question markers and stray option letters, never a complete question.
+    return "".join(f"{i}. Question: A. B. C.\n" for i in range(1, n + 1))
+
+
+CASES = [
+    ("well-formed", well_formed),
+    ("missing answers", missing_answers),
+    ("markers only", markers_only),
+]
+
+
+
+def best_of(func, text: str, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main(sizes=(10, 20, 40, 400, 4000), legacy_limit: int = 40):
+    # The legacy regexes go super-linear on malformed text (tens of seconds at ~50
+    # questions), so on those inputs they are only timed up to legacy_limit questions.
+    print(f"{'input':<18}{'questions':>10}{'chars':>10}{'legacy regex':>16}{'single pass':>15}")
+    for name, make_text in CASES:
+        for n in sizes:
+            text = make_text(n)
+            single = best_of(parse_quiz_text, text)
+            if n <= legacy_limit or name == "well-formed":
+                legacy = f"{best_of(legacy_evaluate_and_parse, text):>13.2f} ms"
+            else:
+                legacy = f"{'skipped':>16}"
+            print(f"{name:<18}{n:>10}{len(text):>10}{legacy}{single:>12.2f} ms")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# tests/test_embedding_cache.py
+# Cache hit/miss accounting of CachedEmbeddings.
+
+from langchain_core.embeddings import Embeddings
+
+from backend.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_repeated_misses_count_as_hits(tmp_path):
+    underlying = CountingEmbeddings()
+    embeddings = CachedEmbeddings(underlying, "test-model", str(tmp_path / "cache.sqlite"))
+    embeddings.embed_queries(["light"])
+
+    vectors = embeddings.embed_queries(["light", "sound", "sound", "heat", "sound"])
+
+    assert sorted(underlying.embedded) == ["heat", "light", "sound"]
+    assert vectors[1] == vectors[2] == vectors[4]
+    assert embeddings.stats() == {"hits": 3, "misses": 3}
+
+
+def test_document_stats_match_embedded_texts(tmp_path):
+    underlying = CountingEmbeddings()
+    embeddings = CachedEmbeddings(underlying, "test-model", str(tmp_path / "cache.sqlite"))
+
+    embeddings.embed_documents(["a", "b", "a"])
+    embeddings.embed_documents(["b", "c"])
+
+    assert embeddings.stats() == {"hits": 2, "misses": 3}
+    assert embeddings.misses == len(underlying.embedded)
@@ -0,0 +1,68 @@
+# tests/test_question_bank.py
+# Background refill: one worker at a time via the lease, one job slot per bucket.
+
+import asyncio
+
+from backend import question_bank
+
+
+class FakeBank:
+    # Stands in for QuestionBank: three empty buckets and a lease table
+    def __init__(self, lease_owner=None):
+        self.stock = {f"Subject {i}": 0 for i in range(3)}
+        self.leases = {"refill": lease_owner} if lease_owner else {}
+
+    def popular_buckets(self, limit):
+        return [{"class": "Class 6", "subject": item, "language": "English"} for item in self.stock][:limit]
+
+    def count(self, class_name, item, language):
+        return self.stock[item]
+
+    def sample(self, class_name, item, language, n):
+        return []
+
+    def add_questions(self, class_name, item, language, questions):
+        self.stock[item] += len(questions)
+        return len(questions)
+
+    def acquire_lease(self, name, owner, seconds):
+        if self.leases.get(name, owner) != owner:
+            return False
+        self.leases[name] = owner
+        return True
+
+    def release_lease(self, name, owner):
+        if self.leases.get(name) == owner:
+            del self.leases[name]
+
+
+def test_refill_takes_one_job_slot_per_bucket(monkeypatch):
+    async def run():
+        jobs = asyncio.Semaphore(2)
+        free_slots = []
+
+        async def fake_generation(n, class_name, item, language, **kwargs):
+            free_slots.append(jobs._value)
+            return [{"question": f"{item} {i}"} for i in range(n)]
+
+        monkeypatch.setattr(question_bank, "arun_quiz_generation_agent", fake_generation)
+        bank = FakeBank()
+        added = await question_bank.arefill_question_bank(bank, target=4, batch=4, jobs=jobs)
+        return bank, jobs, added, free_slots
+
+    bank, jobs, added, free_slots = asyncio.run(run())
+    assert added == 12
+    assert free_slots == [1, 1, 1]
+    assert jobs._value == 2
+    assert bank.leases == {}  # released once the run is over
+
+
+def test_refill_skips_while_another_worker_holds_the_lease(monkeypatch):
+    async def fail_generation(*args, **kwargs):
+        raise AssertionError("generated while another worker holds the lease")
+
+    monkeypatch.setattr(question_bank, "arun_quiz_generation_agent", fail_generation)
+    bank = FakeBank(lease_owner="other-host:1")
+
+    assert asyncio.run(question_bank.arefill_question_bank(bank, target=4)) == 0
+    assert bank.leases == {"refill": "other-host:1"}
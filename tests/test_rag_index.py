@@ -0,0 +1,91 @@
+# tests/test_rag_index.py
+# Chunk removal and vector read-back on the index types build_ann_index creates.
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from backend import rag_vector_store as rag
+
+
+DIM = 16
+COUNT = 400
+
+
+def make_store(index_spec: str):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((COUNT, DIM)).astype("float32")
+    ids = [f"doc{i}::0" for i in range(COUNT)]
+    docs = [Document(page_content=f"chunk {i}", metadata={"source": f"doc{i}"}) for i in range(COUNT)]
+    store = rag._vector_store_from_index(rag.build_ann_index(vectors, index_spec), docs, None, ids)
+    return store, dict(zip(ids, vectors))
+
+
+def store_ids(store) -> list:
+    return [store.index_to_docstore_id[position] for position in range(store.index.ntotal)]
+
+
+def nearest_ids(store, queries: np.ndarray) -> list:
+    rag.tune_index(store.index, nprobe=64, ef_search=256)  # exhaustive enough to be exact here
+    _, found = store.index.search(queries, 1)
+    return [store.index_to_docstore_id[int(position)] for position in found[:, 0]]
+
+
+@pytest.mark.parametrize("index_spec", ["Flat", "IVF8,Flat", "HNSW16"])
+def test_remove_chunks_keeps_positions_and_ids_aligned(index_spec):
+    store, vectors = make_store(index_spec)
+    removed = [f"doc{i}::0" for i in range(0, COUNT, 3)]
+
+    store = rag.remove_chunks(store, removed, index_spec)
+
+    ids = store_ids(store)
+    assert store.index.ntotal == COUNT - len(removed)
+    assert not set(ids) & set(removed)
+    np.testing.assert_allclose(rag.index_vectors(store), np.array([vectors[i] for i in ids]), rtol=1e-5)
+    assert nearest_ids(store, np.array([vectors[i] for i in ids[:50]])) == ids[:50]
+
+
+@pytest.mark.parametrize("index_spec", ["Flat", "IVF8,Flat"])
+def test_add_after_remove_gets_fresh_ids(index_spec):
+    store, vectors = make_store(index_spec)
+    store = rag.remove_chunks(store, ["doc1::0", "doc2::0"], index_spec)
+
+    new_vector = np.full(DIM, 10.0, dtype="float32")
+    store.add_embeddings([("new chunk", new_vector.tolist())], metadatas=[{}], ids=["new::0"])
+
+    assert nearest_ids(store, np.stack([new_vector, vectors["doc3::0"]])) == ["new::0", "doc3::0"]
+    np.testing.assert_allclose(rag.index_vectors(store)[-1], new_vector)
+
+
+def test_remove_keeps_ivf_training():
+    store, _ = make_store("IVF8,Flat")
+    centroids = rag.faiss.extract_index_ivf(store.index).quantizer.reconstruct_n(0, 8)
+
+    store = rag.remove_chunks(store, ["doc0::0"], "IVF8,Flat")
+
+    np.testing.assert_array_equal(rag.faiss.extract_index_ivf(store.index).quantizer.reconstruct_n(0, 8), centroids)
+
+
+@pytest.mark.parametrize("index_spec", ["Flat", "IVF8,Flat", "HNSW16"])
+def test_search_positions_only_returns_selected(index_spec):
+    store, vectors = make_store(index_spec)
+    rag.tune_index(store.index, nprobe=64, ef_search=256)
+    positions = np.arange(0, COUNT, 5, dtype="int64")
+    queries = np.array([vectors[f"doc{i}::0"] for i in (0, 1, 2, 3)])
+
+    distances, found = rag.search_positions(store, queries, 3, positions)
+
+    assert found.shape == (4, 3)
+    assert set(found.ravel()) <= set(positions)
+    assert found[0, 0] == 0  # a selected vector is its own nearest neighbour
+    subset = np.array([vectors[f"doc{p}::0"] for p in positions])
+    exact = positions[np.argsort(((subset[None, :, :] - queries[:, None, :]) ** 2).sum(-1), axis=1)[:, :3]]
+    np.testing.assert_array_equal(found, exact)
+
+
+def test_search_positions_pads_small_selections():
+    store, vectors = make_store("Flat")
+    distances, found = rag.search_positions(store, vectors["doc0::0"][None, :], 4, np.array([7, 9], dtype="int64"))
+
+    assert sorted(found[0, :2]) == [7, 9]
+    assert list(found[0, 2:]) == [-1, -1]
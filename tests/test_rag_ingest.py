@@ -0,0 +1,106 @@
+# tests/test_rag_ingest.py
+# Directory ingestion with delta checkpoints: resume after a crash, re-ingest of changed files.
+
+import os
+import hashlib
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from backend import rag_ingest
+from backend import rag_vector_store as rag
+
+
+class FakeEmbeddings(Embeddings):
+    # Deterministic vectors; raises once more than fail_after batches were embedded
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        if self.fail_after is not None and len(self.embedded) >= self.fail_after:
+            raise RuntimeError("embedding service went away")
+        self.embedded.append(list(texts))
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(8).astype("float32").tolist()
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    source_dir = tmp_path / "curriculum"
+    source_dir.mkdir()
+    for i in range(6):
+        (source_dir / f"lesson{i}.md").write_text(f"Lesson {i} about topic number {i}.", encoding="utf-8")
+    index_dir = str(tmp_path / "rag_index")
+
+    embeddings = {"current": FakeEmbeddings()}
+    monkeypatch.setattr(rag_ingest, "get_embeddings", lambda api_key: embeddings["current"])
+    monkeypatch.setattr(rag, "get_embeddings", lambda api_key: embeddings["current"])
+    return source_dir, index_dir, embeddings
+
+
+def ingest(source_dir, index_dir):
+    return rag_ingest.ingest_directory(str(source_dir), "key", index_dir=index_dir, batch_size=2, concurrency=1,
+                                       checkpoint_every=2, index_spec="Flat")
+
+
+def test_interrupted_run_resumes_from_journal(corpus):
+    source_dir, index_dir, embeddings = corpus
+    embeddings["current"] = FakeEmbeddings(fail_after=2)
+    with pytest.raises(RuntimeError):
+        ingest(source_dir, index_dir)
+
+    journal_dir = os.path.join(index_dir, rag_ingest.INGEST_JOURNAL_DIR)
+    assert rag.read_current_version(index_dir) is None  # nothing published mid-run
+    assert sorted(name for name in os.listdir(journal_dir) if name.endswith(".json")) == [
+        "journal.json", "shard-000001.json", "shard-000002.json"]
+
+    embeddings["current"] = FakeEmbeddings()
+    version = ingest(source_dir, index_dir)
+
+    assert [text for batch in embeddings["current"].embedded for text in batch] == [
+        "Lesson 4 about topic number 4.", "Lesson 5 about topic number 5."]
+    assert not os.path.exists(journal_dir)
+    store = rag.load_rag_db("key", index_dir)
+    assert store.index_version == version
+    assert store.index.ntotal == 6
+    assert sorted(store.index_to_docstore_id.values()) == sorted(f"lesson{i}.md::0" for i in range(6))
+    assert sorted(rag.read_manifest(index_dir)["documents"]) == sorted(f"lesson{i}.md" for i in range(6))
+
+
+def test_changed_file_replaces_its_chunks(corpus):
+    source_dir, index_dir, embeddings = corpus
+    ingest(source_dir, index_dir)
+    (source_dir / "lesson3.md").write_text("Lesson 3, rewritten.", encoding="utf-8")
+
+    ingest(source_dir, index_dir)
+
+    store = rag.load_rag_db("key", index_dir)
+    assert store.index.ntotal == 6
+    assert store.docstore.search("lesson3.md::0").page_content == "Lesson 3, rewritten."
+    position = next(p for p, doc_id in store.index_to_docstore_id.items() if doc_id == "lesson3.md::0")
+    np.testing.assert_allclose(rag.index_vectors(store)[position],
+                               embeddings["current"].embed_query("Lesson 3, rewritten."), rtol=1e-6)
+
+
+def test_stale_journal_is_discarded(corpus):
+    source_dir, index_dir, embeddings = corpus
+    embeddings["current"] = FakeEmbeddings(fail_after=1)
+    with pytest.raises(RuntimeError):
+        ingest(source_dir, index_dir)
+
+    # Another writer publishes a version in the meantime
+    embeddings["current"] = FakeEmbeddings()
+    rag.update_rag_documents("key", upserts=[{"id": "extra", "text": "Extra notes."}], index_dir=index_dir)
+    ingest(source_dir, index_dir)
+
+    store = rag.load_rag_db("key", index_dir)
+    assert store.index.ntotal == 7
+    assert len(set(store.index_to_docstore_id.values())) == 7
@@ -0,0 +1,294 @@
+# tests/test_write_behind.py
+# WriteBehindQueue recovery, DataStore reads and idempotent writes, against an in-memory stand-in for MongoDB.
+
+import os
+import copy
+import time
+import fcntl
+import json
+import uuid
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from backend import student_data
+from backend.student_data import DataStore, WriteBehindQueue, build_attempt
+
+
+class FakeCollection:
+    # The subset of pymongo's Collection the queue and DataStore use
+    def __init__(self):
+        self.docs = {}
+        self.fail_incs = 0           # guarded $inc bulk writes that raise before writing
+        self.around_inc = None       # called with "before"/"after" around a guarded $inc bulk write
+        self.aggregate_rows = []
+        self.pipelines = []
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    @staticmethod
+    def _matches(doc, query):
+        for key, condition in query.items():
+            if isinstance(condition, dict):
+                if condition["$ne"] in doc.get(key, []):
+                    return False
+            elif doc.get(key) != condition:
+                return False
+        return True
+
+    def find_one(self, query, projection=None):
+        for doc in self.docs.values():
+            if self._matches(doc, query):
+                return copy.deepcopy(doc)
+        return None
+
+    def insert_many(self, documents, ordered=True):
+        errors = []
+        for i, document in enumerate(documents):
+            if document["_id"] in self.docs:
+                errors.append({"index": i, "code": 11000})
+            else:
+                self.docs[document["_id"]] = copy.deepcopy(document)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return iter(copy.deepcopy(self.aggregate_rows))
+
+    def bulk_write(self, requests, ordered=True):
+        guarded = any("$inc" in request._doc for request in requests)
+        if guarded and self.fail_incs:
+            self.fail_incs -= 1
+            raise AutoReconnect("connection reset")
+        if guarded and self.around_inc:
+            self.around_inc("before")
+        for request in requests:
+            self._update(request._filter, request._doc, request._upsert)
+        if guarded and self.around_inc:
+            self.around_inc("after")
+
+    def _update(self, query, update, upsert):
+        doc = next((doc for doc in self.docs.values() if self._matches(doc, query)), None)
+        if doc is None:
+            if not upsert:
+                return
+            doc = {"_id": uuid.uuid4().hex, "student_id": query["student_id"], **update.get("$setOnInsert", {})}
+            self.docs[doc["_id"]] = doc
+        for path, value in update.get("$inc", {}).items():
+            student_data._apply_increment(doc, path, value)
+        for field, spec in update.get("$push", {}).items():
+            doc[field] = (doc.get(field, []) + spec["$each"])[spec["$slice"]:]
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        collection = self[name] = FakeCollection()
+        return collection
+
+
+class FakeClient:
+    def __init__(self, *args, **kwargs):
+        self.databases = {}
+
+    def __getitem__(self, name):
+        return self.databases.setdefault(name, FakeDatabase())
+
+    def close(self):
+        pass
+
+
+def student(collection, student_id="s1"):
+    return collection.find_one({"student_id": student_id}) or {}
+
+
+def crash(queue):
+    # Stops the queue without flushing and releases its lock, like a killed process
+    queue._stopped = True
+    queue._wake.set()
+    queue._thread.join()
+    queue._wal.close()
+    queue._owner_lock.close()
+
+
+def wal_files(wal_path):
+    directory, base = os.path.split(wal_path)
+    return sorted(name for name in os.listdir(directory) if name.startswith(base))
+
+
+@pytest.fixture
+def wal_path(tmp_path):
+    return str(tmp_path / "student_writes.wal")
+
+
+def make_queue(collection, wal_path, attempts=None):
+    # No background flushes unless replaying: the tests call flush() themselves
+    return WriteBehindQueue(collection, wal_path, max_pending=1000, flush_interval=3600,
+                            attempts_collection=attempts)
+
+
+def test_crash_after_write_is_not_counted_twice(wal_path):
+    collection, attempts = FakeCollection(), FakeCollection()
+    queue = make_queue(collection, wal_path, attempts)
+    queue.enqueue("s1", "Class 6", {"total_questions_attempted": 5}, build_attempt("s1", "Class 6", [
+        {"subject": "Math", "topic": "Fractions", "is_correct": True}]))
+
+    def die(student_ids):
+        raise SystemExit("killed between the bulk write and removing the batch file")
+
+    queue.on_flush = die
+    with pytest.raises(SystemExit):
+        queue.flush()
+    crash(queue)
+    assert student(collection)["total_questions_attempted"] == 5
+    assert any(".batch-" in name for name in wal_files(wal_path))
+
+    replayed = make_queue(collection, wal_path, attempts)
+    replayed.flush()
+    replayed.close()
+
+    assert student(collection)["total_questions_attempted"] == 5
+    assert len(attempts.docs) == 1
+    assert wal_files(wal_path) == []
+
+
+def test_failed_batch_is_retried(wal_path):
+    collection = FakeCollection()
+    queue = make_queue(collection, wal_path)
+    queue.enqueue("s1", "Class 6", {"total_questions_attempted": 2})
+    collection.fail_incs = 1
+
+    with pytest.raises(AutoReconnect):
+        queue.flush()
+    assert student(collection).get("total_questions_attempted") is None
+    assert queue.pending_for("s1") == ({"total_questions_attempted": 2}, "Class 6")
+
+    queue.enqueue("s1", "Class 6", {"total_questions_attempted": 3})
+    queue.flush()
+
+    assert student(collection)["total_questions_attempted"] == 5
+    assert len(student(collection)["applied_batches"]) == 2  # the failed batch kept its own ID
+    assert queue.pending_for("s1") == ({}, None)
+    queue.close()
+
+
+def test_dead_workers_files_are_adopted(wal_path):
+    # Worker 4000000 died with a WAL and an unwritten batch; worker 4000001 is still running
+    for pid in (4000000, 4000001):
+        prefix = f"{wal_path}.{pid}"
+        line = json.dumps({"student_id": f"s{pid}", "class": "Class 7", "inc": {"total_questions_attempted": 1},
+                           "attempt": None}) + "\n"
+        with open(prefix, "w") as f:
+            f.write(line)
+        with open(f"{prefix}.batch-{uuid.uuid4().hex}", "w") as f:
+            f.write(line)
+        open(prefix + ".lock", "w").close()
+
+    collection = FakeCollection()
+    with open(f"{wal_path}.4000001.lock") as live_lock:
+        fcntl.flock(live_lock, fcntl.LOCK_EX)
+        queue = make_queue(collection, wal_path)
+        queue.flush()
+
+        assert student(collection, "s4000000")["total_questions_attempted"] == 2
+        assert student(collection, "s4000001") == {}
+        assert not any(name.startswith("student_writes.wal.4000000") for name in wal_files(wal_path))
+        assert sum(name.startswith("student_writes.wal.4000001") for name in wal_files(wal_path)) == 3
+        queue.close()
+
+
+def test_overlay_counts_in_flight_batch_once(wal_path):
+    collection = FakeCollection()
+    queue = make_queue(collection, wal_path)
+    queue.enqueue("s1", "Class 6", {"total_questions_attempted": 1})
+    seen = []
+
+    def read(stage):
+        if stage == "before":
+            queue.enqueue("s1", "Class 6", {"total_questions_attempted": 2})  # a submit during the flush
+        doc = student(collection)
+        inc, _ = queue.pending_for("s1", doc.get("applied_batches", []))
+        seen.append(doc.get("total_questions_attempted", 0) + inc.get("total_questions_attempted", 0))
+
+    collection.around_inc = read
+    queue.flush()
+    collection.around_inc = None
+
+    assert seen == [3, 3]
+    assert student(collection)["total_questions_attempted"] == 1
+    queue.flush()
+    assert student(collection)["total_questions_attempted"] == 3
+    queue.close()
+
+
+@pytest.fixture
+def data_store(wal_path, monkeypatch):
+    monkeypatch.setattr(student_data, "MongoClient", FakeClient)
+    store = DataStore("mongodb://fake", write_behind=True, wal_path=wal_path)
+    yield store
+    store.close()
+
+
+def results(*answers):
+    return [{"subject": subject, "topic": topic, "is_correct": correct} for subject, topic, correct in answers]
+
+
+def test_reads_overlay_queued_updates_without_flushing(data_store):
+    data_store.update_student_performance("s1", "Class 6", results(
+        ("Math", "Fractions", False), ("Math", "Algebra", True), ("Science", "Light", True)))
+
+    assert data_store.get_weakest_topics("s1") == ["Math - Fractions"]
+    assert data_store.get_recent_accuracy("s1") == [
+        {"subject": "Math", "total_attempts": 2, "correct_count": 1, "accuracy": 0.5},
+        {"subject": "Science", "total_attempts": 1, "correct_count": 1, "accuracy": 1.0},
+    ]
+    assert data_store.performance.docs == {} and data_store.attempts.docs == {}
+
+
+def test_recent_accuracy_excludes_written_copies_of_queued_attempts(data_store):
+    data_store.update_student_performance("s1", "Class 6", results(("Math", "Fractions", True)))
+    queued = data_store.write_behind.pending_attempts("s1")
+    old = build_attempt("s1", "Class 6", results(("Math", "Algebra", False)))
+    old["timestamp"] = time.time() - 30 * 86400
+    data_store.write_behind.enqueue("s1", "Class 6", {}, old)
+    data_store.attempts.aggregate_rows = [
+        {"subject": "Math", "total_attempts": 3, "correct_count": 0, "accuracy": 0.0}]
+
+    rows = data_store.get_recent_accuracy("s1")
+
+    match = data_store.attempts.pipelines[-1][0]["$match"]
+    assert set(match["_id"]["$nin"]) == {queued[0]["_id"], old["_id"]}
+    assert rows == [{"subject": "Math", "total_attempts": 4, "correct_count": 1, "accuracy": 0.25}]
+
+
+def test_retried_direct_submit_is_recorded_once(wal_path, monkeypatch):
+    monkeypatch.setattr(student_data, "MongoClient", FakeClient)
+    store = DataStore("mongodb://fake", write_behind=False)
+    answers = results(("Math", "Fractions", True), ("Math", "Algebra", False))
+    store.performance.fail_incs = 1  # the attempt is inserted, then the counter update fails
+
+    with pytest.raises(AutoReconnect):
+        store.update_student_performance("s1", "Class 6", answers, submit_id="submit-1")
+    store.update_student_performance("s1", "Class 6", answers, submit_id="submit-1")
+    store.update_student_performance("s1", "Class 6", answers, submit_id="submit-1")
+
+    assert list(store.attempts.docs) == ["submit-1"]
+    assert store.get_student_performance("s1")["subjects"]["Math"] == {
+        "total_attempts": 2, "correct_count": 1,
+        "topics": {"Fractions": {"total_attempts": 1, "correct_count": 1},
+                   "Algebra": {"total_attempts": 1, "correct_count": 0}}}
+    store.close()
+
+
+def test_empty_weakest_selection_is_not_cached(monkeypatch):
+    monkeypatch.setattr(student_data, "MongoClient", FakeClient)
+    store = DataStore("mongodb://fake", write_behind=False)
+
+    assert store.get_weakest_topics("s1") == []
+    store.performance.aggregate_rows = [{"subject": "Math", "topics": ["Fractions"]}]  # written by another worker
+
+    assert store.get_weakest_topics("s1") == ["Math - Fractions"]
+    assert store.get_weakest_topics("s1") == ["Math - Fractions"]
+    assert len(store.performance.pipelines) == 2  # the second selection was cached
+    store.close()